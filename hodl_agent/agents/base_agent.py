@@ -10,14 +10,23 @@ and configuration for AI-driven cryptocurrency investment assistance.
 
 import os
 import json
-from typing import Dict, List, Optional, Any
+import hashlib
+import threading
+from typing import Dict, Iterator, List, Optional, Any
 
 from qwen_agent.agents import Assistant
+from qwen_agent.llm import get_chat_model
 from dotenv import load_dotenv
 
 # Load environment variables
 load_dotenv()
 
+# Prompt used to condense turns evicted from the conversation window
+SUMMARY_PROMPT = "请用简洁的中文总结以下对话的要点，保留用户的投资意图、偏好和关键数字，不超过200字。"
+
+# Prefix of the message carrying the rolling summary
+SUMMARY_PREFIX = "此前对话摘要："
+
 class HODLBoxAgent:
     """
     Base class for HODL Box AI Agents.
@@ -34,22 +43,60 @@ class HODLBoxAgent:
             tools: List of tools to be used by the agent
             system_prompt: System prompt to guide the agent's behavior
         """
+        # Set system prompt. Keep it free of dynamic values (timestamps, user IDs)
+        # so the prompt prefix is byte-identical across turns and sessions.
+        self.system_prompt = system_prompt or "你是一个区块链投资助手，擅长回答加密货币相关问题。"
+        
         # Configure LLM
         self.llm_cfg = {
             'model': 'qwen-flash',  # Default model
             'model_server': os.getenv("BASE_URL", "https://api.example.com/v1"),
             'api_key': os.getenv("API_KEY", ""),
+            'generate_cfg': {
+                # Route requests sharing this system prompt to the same prompt cache
+                'extra_body': {'prompt_cache_key': self._get_prompt_cache_key()},
+            },
         }
         
-        # Set system prompt
-        self.system_prompt = system_prompt or "你是一个区块链投资助手，擅长回答加密货币相关问题。"
-        
         # Initialize agent with tools
         self.tools = tools or []
         self.assistant = Assistant(llm=self.llm_cfg, function_list=self.tools)
         
         # Initialize conversation history
-        self.messages = [{'role': 'system', 'content': self.system_prompt}]
+        self.messages = [self._get_system_message()]
+        
+        # Track the last save so later saves only append new messages
+        self._saved_path: Optional[str] = None
+        self._saved_len = 0
+        
+        # Serialize turns on this agent when it is called from worker threads
+        self._lock = threading.RLock()
+        
+        # Bound the history to the last max_turns turns plus a rolling summary
+        self.max_turns = 20
+        self.summary = ""
+        self._summarizer = None
+    
+    def _get_prompt_cache_key(self) -> str:
+        """
+        Get a stable cache key for the system prompt.
+        
+        Returns:
+            SHA-256 hex digest of the system prompt
+        """
+        return hashlib.sha256(self.system_prompt.encode('utf-8')).hexdigest()
+    
+    def _get_system_message(self) -> Dict[str, str]:
+        """
+        Build the system message that prefixes every conversation.
+        
+        The system message is never edited in place; dynamic content belongs
+        in later messages so the cached prompt prefix stays valid.
+        
+        Returns:
+            System message dictionary
+        """
+        return {'role': 'system', 'content': self.system_prompt}
     
     def process_message(self, user_message: str) -> Dict[str, Any]:
         """
@@ -61,47 +108,181 @@ class HODLBoxAgent:
         Returns:
             Dict containing the response and any additional information
         """
+        # Drain the stream, keeping only the latest response
+        last_response = {}
+        with self._lock:
+            for response in self.stream_message(user_message):
+                last_response = response
+        
+        return last_response
+    
+    def stream_message(self, user_message: str) -> Iterator[Dict[str, Any]]:
+        """
+        Process a user message and yield responses as they are generated.
+        
+        The conversation history is updated once the stream is exhausted.
+        
+        Args:
+            user_message: The user's message to process
+            
+        Yields:
+            Intermediate and final responses from the assistant
+        """
         # Add user message to conversation history
         self.messages.append({'role': 'user', 'content': user_message})
         
         # Generate response
-        responses = []
+        last_response = {}
         for response in self.assistant.run(messages=self.messages):
-            responses.append(response)
-        
-        # Get the last response
-        last_response = responses[-1] if responses else {}
+            last_response = response
+            yield response
         
         # Add assistant response to conversation history
-        if 'content' in last_response:
-            self.messages.append({'role': 'assistant', 'content': last_response['content']})
+        self._append_response(last_response)
         
-        return last_response
+        # Summarize old turns once the window overflows
+        self._trim_history()
+    
+    def _append_response(self, response: Any):
+        """
+        Add the assistant's response for the current turn to the history.
+        
+        The assistant yields the list of messages generated this turn
+        (function calls, function results and the reply), so all of them
+        are kept.
+        
+        Args:
+            response: The final response from the assistant
+        """
+        if isinstance(response, list):
+            self.messages.extend(response)
+        elif 'content' in response:
+            self.messages.append({'role': 'assistant', 'content': response['content']})
+    
+    def _trim_history(self):
+        """
+        Keep the conversation within the sliding window.
+        
+        When more than max_turns turns have accumulated, the oldest turns are
+        folded into the rolling summary. The system prompt stays at index 0
+        so the cached prompt prefix is preserved.
+        """
+        history_start = 2 if self.summary else 1
+        history = self.messages[history_start:]
+        if len(history) <= 2 * self.max_turns:
+            return
+        
+        # Evict the oldest turns, keeping the window starting at a user message
+        cut = self.max_turns
+        while cut < len(history) and history[cut].get('role') != 'user':
+            cut += 1
+        evicted, recent = history[:cut], history[cut:]
+        
+        self.summary = self._summarize(evicted)
+        self.messages = [
+            self._get_system_message(),
+            {'role': 'user', 'content': SUMMARY_PREFIX + self.summary},
+            *recent
+        ]
+        self._saved_path = None
+    
+    def _summarize(self, messages: List[Dict[str, Any]]) -> str:
+        """
+        Summarize evicted messages together with the previous summary.
+        
+        Args:
+            messages: Messages evicted from the conversation window
+            
+        Returns:
+            Updated summary string
+        """
+        transcript = '\n'.join(f"{msg['role']}: {msg.get('content', '')}" for msg in messages)
+        if self.summary:
+            transcript = f"{self.summary}\n{transcript}"
+        
+        try:
+            if self._summarizer is None:
+                self._summarizer = get_chat_model(self.llm_cfg)
+            responses = self._summarizer.chat(
+                messages=[
+                    {'role': 'system', 'content': SUMMARY_PROMPT},
+                    {'role': 'user', 'content': transcript}
+                ],
+                stream=False
+            )
+            summary = responses[-1].get('content') if responses else ''
+            if summary:
+                return summary
+        except Exception:
+            pass
+        
+        # Fall back to keeping the most recent part of the transcript, so the
+        # evicted turns are never dropped without a trace
+        return transcript[-1000:]
     
     def reset_conversation(self):
         """Reset the conversation history."""
-        self.messages = [{'role': 'system', 'content': self.system_prompt}]
+        self.messages = [self._get_system_message()]
+        self.summary = ""
+        self._saved_path = None
     
     def save_conversation(self, filepath: str):
         """
         Save the conversation history to a file.
         
+        The file is written as JSON Lines, one message per line. Saving again
+        to the same file only appends the messages added since the last save.
+        
         Args:
             filepath: Path to the file where the conversation should be saved
         """
-        with open(filepath, 'w', encoding='utf-8') as f:
-            json.dump(self.messages, f, ensure_ascii=False, indent=2)
+        if (filepath == self._saved_path and os.path.exists(filepath)
+                and self._saved_len <= len(self.messages)):
+            mode, start = 'a', self._saved_len
+        else:
+            mode, start = 'w', 0
+        
+        with open(filepath, mode, encoding='utf-8') as f:
+            for message in self.messages[start:]:
+                f.write(json.dumps(message, ensure_ascii=False) + '\n')
+        
+        self._saved_path = filepath
+        self._saved_len = len(self.messages)
     
     def load_conversation(self, filepath: str):
         """
         Load a conversation history from a file.
         
+        Supports JSON Lines files written by save_conversation as well as
+        legacy files containing a single JSON array.
+        
         Args:
             filepath: Path to the file containing the conversation
         """
         with open(filepath, 'r', encoding='utf-8') as f:
-            self.messages = json.load(f)
+            content = f.read()
+        
+        self.summary = ""
+        if content.lstrip().startswith('['):
+            # Legacy format: rewrite as JSON Lines on the next save
+            self.messages = json.loads(content)
+            self._saved_path = None
+        else:
+            self.messages = [json.loads(line) for line in content.splitlines() if line.strip()]
+            self._saved_path = filepath
+            self._saved_len = len(self.messages)
+        
+        # Ensure the current system prompt leads the history so the cached prefix matches
+        if self.messages and self.messages[0].get('role') == 'system':
+            if self.messages[0] != self._get_system_message():
+                self.messages[0] = self._get_system_message()
+                self._saved_path = None
+        else:
+            self.messages.insert(0, self._get_system_message())
+            self._saved_path = None
         
-        # Ensure system prompt is preserved
-        if not any(msg['role'] == 'system' for msg in self.messages):
-            self.messages.insert(0, {'role': 'system', 'content': self.system_prompt})
+        # Restore the rolling summary so the next trim keeps its message out of the window
+        if len(self.messages) > 1:
+            content = self.messages[1].get('content')
+            if isinstance(content, str) and content.startswith(SUMMARY_PREFIX):
+                self.summary = content[len(SUMMARY_PREFIX):]
@@ -56,9 +56,14 @@ class DCAIntentTool(BaseTool):
     def call(self, params: Union[str, dict], **kwargs) -> str:
         if isinstance(params, str):
             try:
-                args = json5.loads(params)
-            except:
-                return json.dumps({"error": "Invalid JSON parameters"})
+                # Fast path: LLM tool arguments are almost always strict JSON
+                args = json.loads(params)
+            except ValueError:
+                try:
+                    # Tolerate trailing commas, unquoted keys, etc.
+                    args = json5.loads(params)
+                except:
+                    return json.dumps({"error": "Invalid JSON parameters"})
         else:
             args = params
 
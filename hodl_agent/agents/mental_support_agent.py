@@ -8,10 +8,41 @@ AI Agent specialized in providing emotional support and motivation
 for cryptocurrency investors during market volatility.
 """
 
+import re
+import copy
 import json
 import random
-from typing import Dict, Any, List
+from typing import Dict, Any, Iterator, List, Sequence, Tuple
 from .base_agent import HODLBoxAgent
+from .response_cache import ResponseCache
+
+# Emotion keywords
+FEARFUL_KEYWORDS = frozenset(['怕', '担心', '恐惧', '恐慌', '焦虑'])
+EXCITED_KEYWORDS = frozenset(['赚', '涨', '激动', '贪婪', '期待'])
+FRUSTRATED_KEYWORDS = frozenset(['亏', '跌', '失望', '沮丧', '伤心'])
+
+# Emotion keyword sets, checked in priority order
+EMOTION_KEYWORDS = (
+    ('fearful', FEARFUL_KEYWORDS),
+    ('excited', EXCITED_KEYWORDS),
+    ('frustrated', FRUSTRATED_KEYWORDS),
+)
+
+# One compiled alternation per emotion, so each category is a single scan
+_EMOTION_PATTERNS = tuple(
+    (emotion, re.compile('|'.join(map(re.escape, sorted(keywords)))))
+    for emotion, keywords in EMOTION_KEYWORDS
+)
+
+def _shuffled_cycle(items: Sequence[str]) -> Iterator[str]:
+    """
+    Cycle through items endlessly, reshuffling on every pass.
+    
+    Every item is used once per pass, so nothing repeats before the whole
+    list has been shown.
+    """
+    while True:
+        yield from random.sample(items, len(items))
 
 class MentalSupportAgent(HODLBoxAgent):
     """
@@ -31,6 +62,9 @@ class MentalSupportAgent(HODLBoxAgent):
             "你是一个加密货币投资心理顾问，专注于为投资者提供情绪支持和鼓励。"
             "在市场波动期间，帮助用户保持理性和纪律，坚持长期投资策略。"
             "根据用户的情绪状态和当前市场状况，提供适当的心理按摩和投资建议。"
+            "用户情绪分为：恐惧(fearful)、兴奋(excited)、沮丧(frustrated)、平静(neutral)；"
+            "市场状态分为：牛市(bull_market)、熊市(bear_market)、剧烈波动(volatile_market)。"
+            "恐惧时强调投资纪律，兴奋时提醒理性评估，沮丧时说明调整是正常现象。"
         )
         
         # Initialize with no specific tools initially
@@ -42,10 +76,17 @@ class MentalSupportAgent(HODLBoxAgent):
         # Load motivational resources
         self.motivational_quotes = self._load_motivational_quotes()
         self.market_advice = self._load_market_advice()
+        self._quote_cycle = _shuffled_cycle(self.motivational_quotes)
+        self._advice_cycles = {
+            state: _shuffled_cycle(advice) for state, advice in self.market_advice.items()
+        }
+        
+        # Cache LLM responses for recurring support requests
+        self.response_cache = ResponseCache()
     
-    def _load_motivational_quotes(self) -> List[str]:
+    def _load_motivational_quotes(self) -> Tuple[str, ...]:
         """Load motivational quotes for different market conditions."""
-        return [
+        return (
             "市场波动是暂时的，价值积累是永恒的。",
             "不要让恐惧或贪婪控制你的投资决策。",
             "在别人恐惧时贪婪，在别人贪婪时恐惧。",
@@ -56,32 +97,32 @@ class MentalSupportAgent(HODLBoxAgent):
             "波动性是加密市场的常态，保持冷静是成功的关键。",
             "持续定投策略能帮助你平滑市场波动风险。",
             "坚持你的投资计划，不要被短期价格波动干扰。"
-        ]
+        )
     
-    def _load_market_advice(self) -> Dict[str, List[str]]:
+    def _load_market_advice(self) -> Dict[str, Tuple[str, ...]]:
         """Load specialized advice for different market conditions."""
         return {
-            "bull_market": [
+            "bull_market": (
                 "牛市中保持谨慎，不要过度杠杆或FOMO追高。",
                 "考虑在价格大幅上涨时分批获利，设置止盈点。",
                 "牛市往往伴随着泡沫，保持理性评估资产价值。",
                 "记住历史规律：牛市之后通常会有调整。",
                 "利用牛市积累的利润为熊市做准备。"
-            ],
-            "bear_market": [
+            ),
+            "bear_market": (
                 "熊市是积累优质资产的最佳时机。",
                 "坚持定投计划，降低平均成本。",
                 "关注项目基本面，而非短期价格走势。",
                 "熊市不会永远持续，历史上每次熊市后都会迎来复苏。",
                 "利用这段时间学习和提升你的投资知识。"
-            ],
-            "volatile_market": [
+            ),
+            "volatile_market": (
                 "市场剧烈波动时，保持冷静尤为重要。",
                 "避免在高波动期间做出冲动决策。",
                 "考虑增加稳定币储备，等待更好的入场机会。",
                 "回顾你的长期投资目标，重新聚焦。",
                 "波动性增加意味着风险上升，确保你的风险暴露在可控范围内。"
-            ]
+            )
         }
     
     def analyze_emotion(self, user_message: str) -> str:
@@ -97,14 +138,24 @@ class MentalSupportAgent(HODLBoxAgent):
         # Simple emotion detection based on keywords
         user_lower = user_message.lower()
         
-        if any(keyword in user_lower for keyword in ['怕', '担心', '恐惧', '恐慌', '焦虑']):
-            return "fearful"
-        elif any(keyword in user_lower for keyword in ['赚', '涨', '激动', '贪婪', '期待']):
-            return "excited"
-        elif any(keyword in user_lower for keyword in ['亏', '跌', '失望', '沮丧', '伤心']):
-            return "frustrated"
-        else:
-            return "neutral"
+        for emotion, pattern in _EMOTION_PATTERNS:
+            if pattern.search(user_lower):
+                return emotion
+        
+        return "neutral"
+    
+    def batch_analyze_emotions(self, messages: List[str]) -> List[str]:
+        """
+        Analyze the emotional state of many messages, e.g. stored chat history.
+        
+        Args:
+            messages: The messages to analyze
+            
+        Returns:
+            List of detected emotions, one per message
+        """
+        analyze = self.analyze_emotion
+        return [analyze(message) for message in messages]
     
     def provide_support(self, user_message: str, market_state: str = "neutral") -> Dict[str, Any]:
         """
@@ -120,11 +171,25 @@ class MentalSupportAgent(HODLBoxAgent):
         # Analyze user emotion
         emotion = self.analyze_emotion(user_message)
         
-        # Generate response based on emotion and market state
-        response = self.process_message(user_message)
-        
-        # Add motivational content
-        motivational_content = self._generate_motivational_content(emotion, market_state)
+        # Hold the agent lock: the cache and quote cycles are shared across requests
+        with self._lock:
+            # Reuse a cached response for a recurring request in the same market state
+            response = self.response_cache.get(user_message, namespace=market_state)
+            if response is None:
+                # Generate response based on emotion and market state
+                response = self.process_message(user_message)
+                self.response_cache.set(user_message, response, namespace=market_state)
+            else:
+                # Record the turn as if the assistant had answered it
+                self.messages.append({'role': 'user', 'content': user_message})
+                self._append_response(response)
+                self._trim_history()
+            
+            # The cache and the history share the response; callers get their own copy
+            response = copy.deepcopy(response)
+            
+            # Add motivational content
+            motivational_content = self._generate_motivational_content(emotion, market_state)
         
         return {
             'original_message': user_message,
@@ -146,13 +211,13 @@ class MentalSupportAgent(HODLBoxAgent):
         Returns:
             Motivational message string
         """
-        # Start with a random motivational quote
-        content = random.choice(self.motivational_quotes) + "\n\n"
+        # Start with the next motivational quote in shuffled order
+        content = next(self._quote_cycle) + "\n\n"
         
         # Add market-specific advice if market state is provided
-        if market_state in self.market_advice:
+        if market_state in self._advice_cycles:
             content += "市场建议：\n"
-            content += random.choice(self.market_advice[market_state])
+            content += next(self._advice_cycles[market_state])
         
         # Add emotion-specific encouragement
         if emotion == "fearful":
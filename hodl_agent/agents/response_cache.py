@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Response Cache for HODL Box Agents
+
+In-memory LRU cache with TTL for agent responses, so recurring questions
+can be answered without another LLM round-trip.
+"""
+
+import re
+import time
+import hashlib
+from collections import OrderedDict
+from typing import Any, Optional, Tuple
+
+# Punctuation and whitespace ignored when matching messages
+_NORMALIZE_RE = re.compile(r'[\s\W_]+', re.UNICODE)
+
+class ResponseCache:
+    """
+    LRU cache for agent responses with time-based expiry.
+    
+    Entries are keyed by a SHA-256 digest of the normalized message and
+    namespaced (e.g. by market state), so near-verbatim repeats such as
+    "我很担心！" and "我很担心" share a single entry.
+    """
+    
+    def __init__(self, max_size: int = 1024, ttl: float = 24 * 60 * 60):
+        """
+        Initialize the response cache.
+        
+        Args:
+            max_size: Maximum number of cached entries
+            ttl: Time to live of an entry in seconds
+        """
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries: 'OrderedDict[str, Tuple[float, Any]]' = OrderedDict()
+    
+    def get(self, message: str, namespace: str = '') -> Optional[Any]:
+        """
+        Look up a cached response.
+        
+        Args:
+            message: The user's message
+            namespace: Cache namespace, e.g. the market state
+        
+        Returns:
+            The cached response, or None if missing or expired
+        """
+        key = self._make_key(message, namespace)
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        
+        expires_at, response = entry
+        if expires_at < time.monotonic():
+            del self._entries[key]
+            return None
+        
+        self._entries.move_to_end(key)
+        return response
+    
+    def set(self, message: str, response: Any, namespace: str = ''):
+        """
+        Store a response in the cache.
+        
+        Args:
+            message: The user's message
+            response: The response to cache
+            namespace: Cache namespace, e.g. the market state
+        """
+        key = self._make_key(message, namespace)
+        self._entries[key] = (time.monotonic() + self.ttl, response)
+        self._entries.move_to_end(key)
+        
+        # Evict least recently used entries
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+    
+    def clear(self):
+        """Remove all cached entries."""
+        self._entries.clear()
+    
+    def __len__(self) -> int:
+        return len(self._entries)
+    
+    def _make_key(self, message: str, namespace: str) -> str:
+        normalized = _NORMALIZE_RE.sub('', message.lower())
+        return hashlib.sha256(f"{namespace}|{normalized}".encode('utf-8')).hexdigest()
@@ -8,7 +8,8 @@ AI Agent specialized in handling cryptocurrency token swap operations,
 including intent parsing and transaction execution.
 """
 
-from typing import Dict, Any, Union
+import json
+from typing import Dict, Any, List, Union
 from qwen_agent.llm.schema import ContentItem
 from .base_agent import HODLBoxAgent
 from .tools.swap_tools import SwapIntentTool
@@ -59,36 +60,66 @@ class SwapAgent(HODLBoxAgent):
             'status': 'success' if swap_intent else 'failed'
         }
     
-    def _extract_swap_intent(self, response: Dict[str, Any]) -> Union[Dict[str, Any], None]:
+    def _extract_swap_intent(self, response: Union[Dict[str, Any], List[Dict[str, Any]]]) -> Union[Dict[str, Any], None]:
         """
         Extract structured swap intent from agent response.
         
         Args:
-            response: The agent's response
+            response: The agent's response, either the list of messages
+                produced by the assistant or a dict with tool calls/results
             
         Returns:
             Parsed swap intent or None if not found
         """
-        # Check if response contains tool calls
-        if 'tool_calls' in response:
-            for tool_call in response['tool_calls']:
-                if tool_call.get('name') == 'parse_swap_intent':
-                    # Return the arguments used for the tool call
-                    return tool_call.get('parameters', {})
+        if isinstance(response, list):
+            return self._extract_swap_intent_from_messages(response)
+        if not isinstance(response, dict):
+            return None
         
-        # Check if response contains tool results
-        if 'tool_results' in response:
-            for result in response['tool_results']:
-                if result.get('name') == 'parse_swap_intent':
-                    # Parse and return the result
+        # Tool calls carry the arguments, tool results carry the parsed JSON
+        extractors = (
+            ('tool_calls', lambda item: item.get('parameters', {})),
+            ('tool_results', lambda item: json.loads(item.get('content', '{}'))),
+        )
+        
+        for key, extract in extractors:
+            for item in response.get(key, ()):
+                if item.get('name') == 'parse_swap_intent':
                     try:
-                        import json
-                        return json.loads(result.get('content', '{}'))
+                        return extract(item)
                     except:
                         return None
         
         return None
     
+    def _extract_swap_intent_from_messages(self, messages: List[Dict[str, Any]]) -> Union[Dict[str, Any], None]:
+        """
+        Extract swap intent from the assistant's message list.
+        
+        Args:
+            messages: Messages returned by the assistant
+            
+        Returns:
+            Parsed swap intent or None if not found
+        """
+        # Function calls carry the arguments, function results carry the parsed JSON
+        for message in messages:
+            function_call = message.get('function_call') or {}
+            if function_call.get('name') == 'parse_swap_intent':
+                payload = function_call.get('arguments', '{}')
+            elif message.get('role') == 'function' and message.get('name') == 'parse_swap_intent':
+                payload = message.get('content', '{}')
+            else:
+                continue
+            
+            try:
+                intent = json.loads(payload) if isinstance(payload, str) else payload
+            except ValueError:
+                return None
+            return intent if isinstance(intent, dict) else None
+        
+        return None
+    
     def validate_swap_intent(self, swap_intent: Dict[str, Any]) -> bool:
         """
         Validate that the swap intent contains all required fields.
@@ -99,16 +130,7 @@ class SwapAgent(HODLBoxAgent):
         Returns:
             True if valid, False otherwise
         """
-        required_fields = ['chain', 'tkBuy', 'tokenOut', 'amount']
-        
-        # Check if all required fields are present
-        for field in required_fields:
-            if field not in swap_intent:
-                return False
-        
-        # Check if values are not empty
-        for field in required_fields:
-            if not swap_intent[field]:
-                return False
+        required_fields = ('chain', 'tkBuy', 'tokenOut', 'amount')
         
-        return True
+        # Check that all required fields are present and not empty
+        return all(swap_intent.get(field) for field in required_fields)
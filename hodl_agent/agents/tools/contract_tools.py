@@ -11,8 +11,12 @@ including token swaps, approval, and other contract interactions.
 import json
 import os
 import time
+import secrets
+import functools
 from typing import Dict, Any, Optional, Union
 from qwen_agent.tools.base import BaseTool, register_tool
+import requests
+from requests.adapters import HTTPAdapter
 from web3 import Web3, HTTPProvider
 from eth_account import Account
 from dotenv import load_dotenv
@@ -20,6 +24,132 @@ from dotenv import load_dotenv
 # Load environment variables if available
 load_dotenv()
 
+# HTTP providers shared by all ContractTool instances, keyed by RPC URL
+_PROVIDERS: Dict[str, HTTPProvider] = {}
+
+def _get_provider(rpc_url: str) -> HTTPProvider:
+    """
+    Get the shared HTTP provider for an RPC URL.
+    
+    Sharing one provider (and its requests session) keeps connections to the
+    RPC node alive across tool instances instead of opening a pool per tool.
+    
+    Args:
+        rpc_url: JSON-RPC endpoint URL
+        
+    Returns:
+        HTTPProvider instance
+    """
+    provider = _PROVIDERS.get(rpc_url)
+    if provider is None:
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=20, pool_maxsize=50)
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        provider = HTTPProvider(rpc_url, request_kwargs={'timeout': 10}, session=session)
+        _PROVIDERS[rpc_url] = provider
+    return provider
+
+# Number of wei in one ether, used for mock token amounts
+WEI_PER_ETHER = 10 ** 18
+
+# Default ABI for common ERC-20 operations, shared read-only by all instances
+ERC20_ABI = (
+    {
+        "constant": True,
+        "inputs": [],
+        "name": "name",
+        "outputs": [{"name": "", "type": "string"}],
+        "type": "function"
+    },
+    {
+        "constant": True,
+        "inputs": [],
+        "name": "symbol",
+        "outputs": [{"name": "", "type": "string"}],
+        "type": "function"
+    },
+    {
+        "constant": True,
+        "inputs": [],
+        "name": "decimals",
+        "outputs": [{"name": "", "type": "uint8"}],
+        "type": "function"
+    },
+    {
+        "constant": True,
+        "inputs": [],
+        "name": "totalSupply",
+        "outputs": [{"name": "", "type": "uint256"}],
+        "type": "function"
+    },
+    {
+        "constant": True,
+        "inputs": [{"name": "_owner", "type": "address"}],
+        "name": "balanceOf",
+        "outputs": [{"name": "balance", "type": "uint256"}],
+        "type": "function"
+    },
+    {
+        "constant": True,
+        "inputs": [
+            {"name": "_owner", "type": "address"},
+            {"name": "_spender", "type": "address"}
+        ],
+        "name": "allowance",
+        "outputs": [{"name": "remaining", "type": "uint256"}],
+        "type": "function"
+    },
+    {
+        "constant": False,
+        "inputs": [
+            {"name": "_to", "type": "address"},
+            {"name": "_value", "type": "uint256"}
+        ],
+        "name": "transfer",
+        "outputs": [{"name": "success", "type": "bool"}],
+        "type": "function"
+    },
+    {
+        "constant": False,
+        "inputs": [
+            {"name": "_spender", "type": "address"},
+            {"name": "_value", "type": "uint256"}
+        ],
+        "name": "approve",
+        "outputs": [{"name": "success", "type": "bool"}],
+        "type": "function"
+    },
+    {
+        "constant": False,
+        "inputs": [
+            {"name": "_from", "type": "address"},
+            {"name": "_to", "type": "address"},
+            {"name": "_value", "type": "uint256"}
+        ],
+        "name": "transferFrom",
+        "outputs": [{"name": "success", "type": "bool"}],
+        "type": "function"
+    },
+)
+
+# ERC20_ABI entries indexed by function name
+ERC20_BY_NAME = {entry['name']: entry for entry in ERC20_ABI}
+
+# Responses for constant error cases
+_ERR_MISSING_PARAMS = {
+    'error': 'Missing required parameters: contract_address and function_name',
+    'status': 'error'
+}
+_ERR_ABI_REQUIRED = {
+    'error': 'ABI is required for this operation',
+    'status': 'error'
+}
+
+# The same responses serialized once, returned by call() as is
+_ERR_MISSING_PARAMS_JSON = json.dumps(_ERR_MISSING_PARAMS, ensure_ascii=False)
+_ERR_ABI_REQUIRED_JSON = json.dumps(_ERR_ABI_REQUIRED, ensure_ascii=False)
+
 @register_tool('execute_contract_call')
 class ContractTool(BaseTool):
     """
@@ -69,11 +199,11 @@ class ContractTool(BaseTool):
         self.private_key = os.getenv('PRIVATE_KEY', '')
         self.chain_id = int(os.getenv('CHAIN_ID', '1'))  # Default to Ethereum mainnet
         
-        # Initialize Web3 connection
-        self.web3 = self._init_web3()
-        
         # Default ABIs for common operations
-        self.erc20_abi = self._get_erc20_abi()
+        self.erc20_abi = ERC20_ABI
+        
+        # Reuse contract objects for the default ABI instead of rebuilding them per call
+        self._get_erc20_contract = functools.lru_cache(maxsize=256)(self._build_erc20_contract)
         
         # Use mock implementation if no private key is provided
         self.use_mock = not self.private_key
@@ -88,12 +218,48 @@ class ContractTool(BaseTool):
         Returns:
             JSON string with contract call result or transaction details
         """
-        # Validate required parameters
-        if 'contract_address' not in params or 'function_name' not in params:
+        result = self._execute(params)
+        if result is _ERR_MISSING_PARAMS:
+            return _ERR_MISSING_PARAMS_JSON
+        if result is _ERR_ABI_REQUIRED:
+            return _ERR_ABI_REQUIRED_JSON
+        try:
+            return json.dumps(result, ensure_ascii=False)
+        except (TypeError, ValueError) as e:
             return json.dumps({
-                'error': 'Missing required parameters: contract_address and function_name',
+                'error': str(e),
                 'status': 'error'
-            })
+            }, ensure_ascii=False)
+    
+    def call_dict(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Execute a smart contract call without serializing the result.
+        
+        Args:
+            params: Dictionary containing contract call parameters
+            
+        Returns:
+            Contract call result or transaction details, or an error dictionary
+        """
+        result = self._execute(params)
+        # Copy the shared constant error responses so callers may modify them
+        if result is _ERR_MISSING_PARAMS or result is _ERR_ABI_REQUIRED:
+            return dict(result)
+        return result
+    
+    def _execute(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Execute a smart contract call, returning constant errors uncopied.
+        
+        Args:
+            params: Dictionary containing contract call parameters
+            
+        Returns:
+            Contract call result or transaction details, or an error dictionary
+        """
+        # Validate required parameters
+        if 'contract_address' not in params or 'function_name' not in params:
+            return _ERR_MISSING_PARAMS
         
         try:
             # Format parameters
@@ -109,10 +275,7 @@ class ContractTool(BaseTool):
                 abi = self.erc20_abi
             
             if not abi:
-                return json.dumps({
-                    'error': 'ABI is required for this operation',
-                    'status': 'error'
-                })
+                return _ERR_ABI_REQUIRED
             
             # Execute based on whether it's a read or write operation
             if self.use_mock or not is_write_operation:
@@ -121,20 +284,20 @@ class ContractTool(BaseTool):
                     contract_address, function_name, function_args, abi
                 )
                 
-                return json.dumps({
+                return {
                     'status': 'success',
                     'result': result,
                     'type': 'read' if not is_write_operation else 'mock_write',
                     'contract_address': contract_address,
                     'function_name': function_name
-                }, ensure_ascii=False)
+                }
             else:
                 # For write operations, send a transaction
                 tx_hash = self._send_transaction(
                     contract_address, function_name, function_args, abi, gas_limit
                 )
                 
-                return json.dumps({
+                return {
                     'status': 'success',
                     'tx_hash': tx_hash,
                     'type': 'write',
@@ -142,13 +305,23 @@ class ContractTool(BaseTool):
                     'function_name': function_name,
                     'chain_id': self.chain_id,
                     'explorer_url': f"https://etherscan.io/tx/{tx_hash}"
-                }, ensure_ascii=False)
+                }
                 
         except Exception as e:
-            return json.dumps({
+            return {
                 'error': str(e),
                 'status': 'error'
-            }, ensure_ascii=False)
+            }
+    
+    @functools.cached_property
+    def web3(self) -> Web3:
+        """
+        Web3 connection, created on first use so the mock path never builds one.
+        
+        Returns:
+            Web3 instance
+        """
+        return self._init_web3()
     
     def _init_web3(self) -> Web3:
         """
@@ -157,7 +330,7 @@ class ContractTool(BaseTool):
         Returns:
             Web3 instance
         """
-        web3 = Web3(HTTPProvider(self.rpc_url))
+        web3 = Web3(_get_provider(self.rpc_url))
         # web3.middleware_onion.inject(geth_poa_middleware, layer=0) # Removed in v7
         return web3
     
@@ -167,7 +340,7 @@ class ContractTool(BaseTool):
         if self.use_mock:
             return self._get_mock_call_result(function_name, function_args)
         
-        contract = self.web3.eth.contract(address=contract_address, abi=abi)
+        contract = self._get_contract(contract_address, abi)
         func = getattr(contract.functions, function_name)
         result = func(*function_args).call()
         return result
@@ -180,109 +353,47 @@ class ContractTool(BaseTool):
         account = Account.from_key(self.private_key)
         address = account.address
         
-        contract = self.web3.eth.contract(address=contract_address, abi=abi)
-        nonce = self.web3.eth.get_transaction_count(address)
+        contract = self._get_contract(contract_address, abi)
         func = getattr(contract.functions, function_name)
         
+        # Fetch nonce and gas price in a single JSON-RPC batch round-trip
+        with self.web3.batch_requests() as batch:
+            batch.add(self.web3.eth.get_transaction_count(address))
+            batch.add(self.web3.eth.gas_price)
+            nonce, gas_price = batch.execute()
+        
         tx = func(*function_args).build_transaction({
             'from': address,
             'nonce': nonce,
             'gas': gas_limit,
             'chainId': self.chain_id,
-            'gasPrice': self.web3.eth.gas_price
+            'gasPrice': gas_price
         })
         
         signed_tx = self.web3.eth.account.sign_transaction(tx, self.private_key)
         tx_hash = self.web3.eth.send_raw_transaction(signed_tx.rawTransaction)
         return self.web3.to_hex(tx_hash)
     
-    def _is_erc20_operation(self, function_name: str) -> bool:
-        erc20_functions = [
-            'name', 'symbol', 'decimals', 'totalSupply',
-            'balanceOf', 'transfer', 'allowance',
-            'approve', 'transferFrom'
-        ]
-        return function_name in erc20_functions
+    def _get_contract(self, contract_address: str, abi: Any):
+        """
+        Get a contract object, reusing cached ones for the default ERC-20 ABI.
+        
+        Args:
+            contract_address: Checksum contract address
+            abi: Contract ABI
+            
+        Returns:
+            Web3 contract instance
+        """
+        if abi is ERC20_ABI:
+            return self._get_erc20_contract(contract_address)
+        return self.web3.eth.contract(address=contract_address, abi=abi)
     
-    def _get_erc20_abi(self) -> list:
-        return [
-            {
-                "constant": True,
-                "inputs": [],
-                "name": "name",
-                "outputs": [{"name": "", "type": "string"}],
-                "type": "function"
-            },
-            {
-                "constant": True,
-                "inputs": [],
-                "name": "symbol",
-                "outputs": [{"name": "", "type": "string"}],
-                "type": "function"
-            },
-            {
-                "constant": True,
-                "inputs": [],
-                "name": "decimals",
-                "outputs": [{"name": "", "type": "uint8"}],
-                "type": "function"
-            },
-            {
-                "constant": True,
-                "inputs": [],
-                "name": "totalSupply",
-                "outputs": [{"name": "", "type": "uint256"}],
-                "type": "function"
-            },
-            {
-                "constant": True,
-                "inputs": [{"name": "_owner", "type": "address"}],
-                "name": "balanceOf",
-                "outputs": [{"name": "balance", "type": "uint256"}],
-                "type": "function"
-            },
-            {
-                "constant": True,
-                "inputs": [
-                    {"name": "_owner", "type": "address"},
-                    {"name": "_spender", "type": "address"}
-                ],
-                "name": "allowance",
-                "outputs": [{"name": "remaining", "type": "uint256"}],
-                "type": "function"
-            },
-            {
-                "constant": False,
-                "inputs": [
-                    {"name": "_to", "type": "address"},
-                    {"name": "_value", "type": "uint256"}
-                ],
-                "name": "transfer",
-                "outputs": [{"name": "success", "type": "bool"}],
-                "type": "function"
-            },
-            {
-                "constant": False,
-                "inputs": [
-                    {"name": "_spender", "type": "address"},
-                    {"name": "_value", "type": "uint256"}
-                ],
-                "name": "approve",
-                "outputs": [{"name": "success", "type": "bool"}],
-                "type": "function"
-            },
-            {
-                "constant": False,
-                "inputs": [
-                    {"name": "_from", "type": "address"},
-                    {"name": "_to", "type": "address"},
-                    {"name": "_value", "type": "uint256"}
-                ],
-                "name": "transferFrom",
-                "outputs": [{"name": "success", "type": "bool"}],
-                "type": "function"
-            }
-        ]
+    def _build_erc20_contract(self, contract_address: str):
+        return self.web3.eth.contract(address=contract_address, abi=ERC20_ABI)
+    
+    def _is_erc20_operation(self, function_name: str) -> bool:
+        return function_name in ERC20_BY_NAME
     
     def _get_mock_call_result(self, function_name: str, function_args: list) -> Any:
         if function_name == 'name':
@@ -292,16 +403,15 @@ class ContractTool(BaseTool):
         elif function_name == 'decimals':
             return 18
         elif function_name == 'totalSupply':
-            return self.web3.to_wei(1000000, 'ether')
+            return 1_000_000 * WEI_PER_ETHER
         elif function_name == 'balanceOf':
-            return self.web3.to_wei(100, 'ether')
+            return 100 * WEI_PER_ETHER
         elif function_name == 'allowance':
-            return self.web3.to_wei(50, 'ether')
+            return 50 * WEI_PER_ETHER
         elif function_name in ['transfer', 'approve', 'transferFrom']:
             return True
         else:
             return 'Mock result for ' + function_name
     
     def _get_mock_tx_hash(self) -> str:
-        import random
-        return '0x' + ''.join(random.choices('0123456789abcdef', k=64))
+        return '0x' + secrets.token_hex(32)
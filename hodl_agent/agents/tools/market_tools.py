@@ -8,16 +8,200 @@ This module provides tools for fetching cryptocurrency market data,
 including price information, market trends, and volatility indicators.
 """
 
-import json
 import os
-from typing import Dict, Any, Optional
+import time
+import asyncio
+import random
+import weakref
+import datetime
+from urllib.parse import quote
+from typing import Dict, Any, List, Optional, Sequence, Tuple
 from qwen_agent.tools.base import BaseTool, register_tool
-import requests
+import httpx
+import numpy as np
+import orjson
 from dotenv import load_dotenv
 
 # Load environment variables if available
 load_dotenv()
 
+# Seconds a fetched price stays fresh
+MARKET_DATA_TTL = 30
+
+# Maximum number of cached (symbol, vs_currency) entries
+MARKET_DATA_CACHE_SIZE = 1024
+
+# Fetched market data shared by all tool instances: key -> (expires_at, data)
+_MARKET_DATA_CACHE: Dict[Tuple[str, str], Tuple[float, Dict[str, Any]]] = {}
+
+# Consecutive API failures that open the circuit breaker
+BREAKER_FAILURE_THRESHOLD = 5
+
+# Seconds the breaker stays open, serving mock data without calling the API
+BREAKER_COOLDOWN = 30
+
+# Circuit breaker state shared by all tool instances
+_BREAKER = {'fail_count': 0, 'open_until': 0.0}
+
+# Market trends as (trend, description), indexed by _classify_trend
+TRENDS = (
+    ('bull_market', '强劲牛市'),
+    ('uptrend', '上升趋势'),
+    ('bear_market', '熊市'),
+    ('downtrend', '下降趋势'),
+    ('sideways', '横盘整理'),
+)
+
+# Volatility levels, indexed by the number of thresholds the 24h change exceeds
+VOLATILITY_LEVELS = ('low', 'medium', 'high')
+
+# Advice for each market trend and volatility level
+MARKET_ADVICE = {
+    'bull_market': {
+        'high': '牛市高波动，建议谨慎追高，考虑分批获利。',
+        'medium': '牛市中等波动，可适度跟进但保持风险控制。',
+        'low': '牛市低波动，可能预示更大上涨，关注成交量变化。'
+    },
+    'uptrend': {
+        'high': '上升趋势高波动，适合设置止损的逢低买入策略。',
+        'medium': '稳定上升趋势，适合定投策略。',
+        'low': '低波动上升，突破阻力位可能加速上涨。'
+    },
+    'bear_market': {
+        'high': '熊市高波动，建议观望或小仓位试探，严格止损。',
+        'medium': '熊市中等波动，耐心等待抄底机会，关注基本面。',
+        'low': '熊市低波动，可能即将出现方向性突破。'
+    },
+    'downtrend': {
+        'high': '下降趋势高波动，避免抄底，等待趋势反转信号。',
+        'medium': '稳定下降趋势，保持观望或考虑对冲策略。',
+        'low': '低波动下降，可能是下跌中继，谨慎操作。'
+    },
+    'sideways': {
+        'high': '横盘高波动，适合区间交易策略，关注突破方向。',
+        'medium': '横盘整理，等待明确方向，可少量布局。',
+        'low': '低波动横盘，即将选择方向，密切关注成交量变化。'
+    }
+}
+
+# Complete market state analysis for every (trend, volatility) combination
+_MARKET_STATE_TABLE = tuple(
+    tuple(
+        {
+            'trend': trend,
+            'trend_description': trend_description,
+            'volatility': volatility,
+            'advice': MARKET_ADVICE[trend][volatility]
+        }
+        for volatility in VOLATILITY_LEVELS
+    )
+    for trend, trend_description in TRENDS
+)
+
+# Response for requests without a symbol
+_ERR_SYMBOL_REQUIRED = {
+    'error': 'Symbol parameter is required',
+    'status': 'error'
+}
+_ERR_SYMBOL_REQUIRED_JSON = orjson.dumps(_ERR_SYMBOL_REQUIRED).decode()
+
+# HTTP clients shared by all tool instances, keeping connections to the API alive.
+# Both are created on first use; async clients are bound to the event loop that
+# created them, so there is one per running loop.
+_HTTP_TIMEOUT = 5.0
+_HTTP_LIMITS = httpx.Limits(max_keepalive_connections=50)
+_CLIENT: Optional[httpx.Client] = None
+_ASYNC_CLIENTS: 'weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, httpx.AsyncClient]' = weakref.WeakKeyDictionary()
+
+def _get_client() -> httpx.Client:
+    """
+    Get the shared sync HTTP client, creating it on first use.
+    
+    Returns:
+        httpx.Client instance
+    """
+    global _CLIENT
+    if _CLIENT is None:
+        _CLIENT = httpx.Client(timeout=_HTTP_TIMEOUT, limits=_HTTP_LIMITS)
+    return _CLIENT
+
+def _get_async_client() -> httpx.AsyncClient:
+    """
+    Get the async HTTP client of the running event loop, creating it on first use.
+    
+    Returns:
+        httpx.AsyncClient instance
+    """
+    loop = asyncio.get_running_loop()
+    client = _ASYNC_CLIENTS.get(loop)
+    if client is None:
+        client = _ASYNC_CLIENTS[loop] = httpx.AsyncClient(timeout=_HTTP_TIMEOUT, limits=_HTTP_LIMITS)
+    return client
+
+async def aclose_async_client():
+    """Close the async HTTP client of the running event loop, e.g. on application shutdown."""
+    client = _ASYNC_CLIENTS.pop(asyncio.get_running_loop(), None)
+    if client is not None:
+        await client.aclose()
+
+# Async fetches in progress, shared by concurrent callers: key -> future
+_INFLIGHT: Dict[Tuple[str, str], 'asyncio.Future[Dict[str, Any]]'] = {}
+
+class _FetchAbandoned(Exception):
+    """Set on an in-flight future when its leader is cancelled; waiters retry."""
+
+def _breaker_open() -> bool:
+    """
+    Check whether the API circuit breaker is open.
+    
+    Returns:
+        True if API calls should be skipped
+    """
+    return time.monotonic() < _BREAKER['open_until']
+
+def _record_api_result(success: bool):
+    """
+    Update the circuit breaker after an API call.
+    
+    Args:
+        success: Whether the call succeeded
+    """
+    if success:
+        _BREAKER['fail_count'] = 0
+        return
+    
+    _BREAKER['fail_count'] += 1
+    if _BREAKER['fail_count'] >= BREAKER_FAILURE_THRESHOLD:
+        _BREAKER['open_until'] = time.monotonic() + BREAKER_COOLDOWN
+        _BREAKER['fail_count'] = 0
+
+def classify_market_states(changes_24h: Sequence[float], changes_7d: Sequence[float]) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Classify trend and volatility for arrays of price changes in one pass.
+    
+    Vectorized counterpart of MarketDataTool._classify_trend and the
+    volatility thresholds in MarketDataTool._analyze_market_state.
+    
+    Args:
+        changes_24h: 24h price change percentages
+        changes_7d: 7d price change percentages
+        
+    Returns:
+        Tuple of (trend indexes into TRENDS, volatility indexes into VOLATILITY_LEVELS)
+    """
+    c24 = np.asarray(changes_24h, dtype=np.float64)
+    c7 = np.asarray(changes_7d, dtype=np.float64)
+    
+    # Conditions in the same priority order as _classify_trend
+    trend_idx = np.select(
+        [(c24 > 5) & (c7 > 10), (c24 > 0) & (c7 > 0), (c24 < -5) & (c7 < -10), (c24 < 0) & (c7 < 0)],
+        [0, 1, 2, 3],
+        default=4
+    )
+    abs_c24 = np.abs(c24)
+    volatility_idx = (abs_c24 > 3).astype(np.intp) + (abs_c24 > 1)
+    return trend_idx, volatility_idx
+
 @register_tool('get_market_data')
 class MarketDataTool(BaseTool):
     """
@@ -55,6 +239,11 @@ class MarketDataTool(BaseTool):
         self.api_url = os.getenv('MARKET_DATA_API_URL', 'https://api.coingecko.com/api/v3')
         # Default to a mock implementation if no API key is provided
         self.use_mock = not self.api_key and 'coinmarketcap' in self.api_url.lower()
+        # Only ids and vs_currencies vary between price requests
+        self._price_url_tmpl = (
+            self.api_url
+            + '/simple/price?include_24hr_change=true&include_7d_change=true&ids={ids}&vs_currencies={vs}'
+        )
     
     def call(self, params: Dict[str, Any]) -> str:
         """
@@ -66,16 +255,39 @@ class MarketDataTool(BaseTool):
         Returns:
             JSON string with cryptocurrency market data
         """
+        if not self._parse_params(params)[0]:
+            return _ERR_SYMBOL_REQUIRED_JSON
+        return orjson.dumps(self.call_dict(params)).decode()
+    
+    async def acall(self, params: Dict[str, Any]) -> str:
+        """
+        Execute the market data fetching tool without blocking the event loop.
+        
+        Args:
+            params: Dictionary containing the parameters for market data retrieval
+            
+        Returns:
+            JSON string with cryptocurrency market data
+        """
+        if not self._parse_params(params)[0]:
+            return _ERR_SYMBOL_REQUIRED_JSON
+        return orjson.dumps(await self.acall_dict(params)).decode()
+    
+    def call_dict(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Fetch market data without serializing it.
+        
+        Args:
+            params: Dictionary containing the parameters for market data retrieval
+            
+        Returns:
+            Market data dictionary, or an error dictionary
+        """
         # Extract and validate parameters
-        symbol = params.get('symbol', '').lower()
-        vs_currency = params.get('vs_currency', 'usd').lower()
-        include_market_state = params.get('include_market_state', True)
+        symbol, vs_currency, include_market_state = self._parse_params(params)
         
         if not symbol:
-            return json.dumps({
-                'error': 'Symbol parameter is required',
-                'status': 'error'
-            })
+            return dict(_ERR_SYMBOL_REQUIRED)
         
         try:
             # Fetch market data
@@ -84,17 +296,104 @@ class MarketDataTool(BaseTool):
             else:
                 data = self._fetch_market_data(symbol, vs_currency)
             
-            # Add market state analysis if requested
-            if include_market_state:
-                data['market_state'] = self._analyze_market_state(data)
+            return self._format_result(data, include_market_state)
+            
+        except Exception as e:
+            return {
+                'error': str(e),
+                'status': 'error'
+            }
+    
+    async def acall_dict(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Fetch market data without serializing it or blocking the event loop.
+        
+        Args:
+            params: Dictionary containing the parameters for market data retrieval
+            
+        Returns:
+            Market data dictionary, or an error dictionary
+        """
+        symbol, vs_currency, include_market_state = self._parse_params(params)
+        
+        if not symbol:
+            return dict(_ERR_SYMBOL_REQUIRED)
+        
+        try:
+            if self.use_mock:
+                data = self._get_mock_data(symbol, vs_currency)
+            else:
+                data = await self._afetch_market_data(symbol, vs_currency)
             
-            return json.dumps(data, ensure_ascii=False)
+            return self._format_result(data, include_market_state)
             
         except Exception as e:
-            return json.dumps({
+            return {
                 'error': str(e),
                 'status': 'error'
-            })
+            }
+    
+    async def abatch_call(self, symbols: Sequence[str], vs_currency: str = 'usd',
+                          include_market_state: bool = True) -> List[Dict[str, Any]]:
+        """
+        Fetch market data for several symbols with a single API round-trip.
+        
+        Args:
+            symbols: Cryptocurrency symbols
+            vs_currency: Reference currency for pricing
+            include_market_state: Whether to include market state analysis
+            
+        Returns:
+            Market data dictionaries, one per unique symbol in input order
+        """
+        symbols = list(dict.fromkeys(symbol.lower() for symbol in symbols if symbol))
+        vs_currency = (vs_currency or 'usd').lower()
+        
+        if self.use_mock:
+            results = [self._get_mock_data(symbol, vs_currency) for symbol in symbols]
+        else:
+            results = await self._afetch_market_data_batch(symbols, vs_currency)
+        
+        if include_market_state and results:
+            states = self.analyze_batch(
+                [data['price_change_percentage_24h'] for data in results],
+                [data['price_change_percentage_7d'] for data in results]
+            )
+            for data, state in zip(results, states):
+                data['market_state'] = state
+        
+        return results
+    
+    def _parse_params(self, params: Dict[str, Any]) -> Tuple[str, str, bool]:
+        """
+        Extract market data parameters.
+        
+        Args:
+            params: Raw tool parameters
+            
+        Returns:
+            Tuple of (symbol, vs_currency, include_market_state)
+        """
+        symbol = params.get('symbol', '').lower()
+        vs_currency = (params.get('vs_currency') or 'usd').lower()
+        include_market_state = params.get('include_market_state', True)
+        return symbol, vs_currency, include_market_state
+    
+    def _format_result(self, data: Dict[str, Any], include_market_state: bool) -> Dict[str, Any]:
+        """
+        Add market state analysis to market data if requested.
+        
+        Args:
+            data: Market data dictionary
+            include_market_state: Whether to include market state analysis
+            
+        Returns:
+            Market data dictionary
+        """
+        if include_market_state:
+            data['market_state'] = self._analyze_market_state(data)
+        
+        return data
     
     def _fetch_market_data(self, symbol: str, vs_currency: str) -> Dict[str, Any]:
         """
@@ -107,43 +406,218 @@ class MarketDataTool(BaseTool):
         Returns:
             Market data dictionary
         """
+        # Serve recent prices from the cache without a network round-trip
+        cached = self._get_cached_market_data(symbol, vs_currency)
+        if cached:
+            return cached
+        
+        # Fail fast while the API is known to be down
+        if _breaker_open():
+            return self._get_mock_data(symbol, vs_currency)
+        
         try:
-            # Construct URL for CoinGecko API
-            url = f"{self.api_url}/simple/price"
-            params = {
-                'ids': symbol,
-                'vs_currencies': vs_currency,
-                'include_24hr_change': True,
-                'include_7d_change': True
-            }
-            
             # Make request
-            response = requests.get(url, params=params)
+            response = _get_client().get(self._build_price_url(symbol, vs_currency))
             response.raise_for_status()  # Raise error for bad status codes
+            payload = response.json()
+        except Exception as e:
+            # If the real API fails, fall back to mock data
+            _record_api_result(False)
+            print(f"Error fetching real data: {e}, falling back to mock data")
+            return self._get_mock_data(symbol, vs_currency)
+        
+        _record_api_result(True)
+        try:
+            return self._parse_price_response(symbol, vs_currency, payload)
+        except Exception as e:
+            print(f"Error fetching real data: {e}, falling back to mock data")
+            return self._get_mock_data(symbol, vs_currency)
+    
+    async def _afetch_market_data(self, symbol: str, vs_currency: str) -> Dict[str, Any]:
+        """
+        Fetch real market data from an external API asynchronously.
+        
+        Args:
+            symbol: Cryptocurrency symbol
+            vs_currency: Reference currency for pricing
             
-            data = response.json()
+        Returns:
+            Market data dictionary
+        """
+        key = (symbol, vs_currency)
+        while True:
+            cached = self._get_cached_market_data(symbol, vs_currency)
+            if cached:
+                return cached
             
-            # Format the data
-            if symbol in data:
-                price_data = data[symbol]
-                return {
-                    'symbol': symbol.upper(),
-                    'price': price_data.get(vs_currency, 0),
-                    'price_change_percentage_24h': price_data.get(f'{vs_currency}_24h_change', 0),
-                    'price_change_percentage_7d': price_data.get(f'{vs_currency}_7d_change', 0),
-                    'vs_currency': vs_currency.upper(),
-                    'timestamp': self._get_current_timestamp(),
-                    'source': 'CoinGecko API',
-                    'status': 'success'
-                }
-            else:
-                raise ValueError(f"Symbol {symbol} not found")
-                
+            # Join a request already in flight for the same key instead of sending another
+            inflight = _INFLIGHT.get(key)
+            if inflight is None:
+                break
+            try:
+                return dict(await asyncio.shield(inflight))
+            except _FetchAbandoned:
+                # The leader was cancelled; look again and fetch ourselves if needed
+                continue
+        
+        future = asyncio.get_running_loop().create_future()
+        _INFLIGHT[key] = future
+        try:
+            data = await self._arequest_market_data(symbol, vs_currency)
+        except asyncio.CancelledError:
+            # Waiters must not see our cancellation as their own
+            future.set_exception(_FetchAbandoned())
+            future.exception()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            future.exception()  # Mark as retrieved in case nobody else waits
+            raise
+        else:
+            future.set_result(data)
+            return dict(data)
+        finally:
+            _INFLIGHT.pop(key, None)
+    
+    async def _arequest_market_data(self, symbol: str, vs_currency: str) -> Dict[str, Any]:
+        """
+        Request market data from the external API, falling back to mock data.
+        
+        Args:
+            symbol: Cryptocurrency symbol
+            vs_currency: Reference currency for pricing
+            
+        Returns:
+            Market data dictionary
+        """
+        if _breaker_open():
+            return self._get_mock_data(symbol, vs_currency)
+        
+        try:
+            response = await _get_async_client().get(self._build_price_url(symbol, vs_currency))
+            response.raise_for_status()
+            payload = response.json()
+        except Exception as e:
+            _record_api_result(False)
+            print(f"Error fetching real data: {e}, falling back to mock data")
+            return self._get_mock_data(symbol, vs_currency)
+        
+        _record_api_result(True)
+        try:
+            return self._parse_price_response(symbol, vs_currency, payload)
         except Exception as e:
-            # If the real API fails, fall back to mock data
             print(f"Error fetching real data: {e}, falling back to mock data")
             return self._get_mock_data(symbol, vs_currency)
     
+    async def _afetch_market_data_batch(self, symbols: List[str], vs_currency: str) -> List[Dict[str, Any]]:
+        """
+        Fetch real market data for several symbols in one request.
+        
+        Symbols still fresh in the cache are served from it; the rest are
+        requested together, since CoinGecko accepts a comma-separated id list.
+        
+        Args:
+            symbols: Unique cryptocurrency symbols
+            vs_currency: Reference currency for pricing
+            
+        Returns:
+            Market data dictionaries in the order of symbols
+        """
+        results = {symbol: self._get_cached_market_data(symbol, vs_currency) for symbol in symbols}
+        missing = [symbol for symbol, data in results.items() if not data]
+        
+        if missing:
+            payload = {}
+            if not _breaker_open():
+                try:
+                    url = self._build_price_url(','.join(missing), vs_currency)
+                    response = await _get_async_client().get(url)
+                    response.raise_for_status()
+                    payload = response.json()
+                    _record_api_result(True)
+                except Exception as e:
+                    _record_api_result(False)
+                    print(f"Error fetching real data: {e}, falling back to mock data")
+            
+            for symbol in missing:
+                if symbol in payload:
+                    results[symbol] = self._parse_price_response(symbol, vs_currency, payload)
+                else:
+                    results[symbol] = self._get_mock_data(symbol, vs_currency)
+        
+        return [results[symbol] for symbol in symbols]
+    
+    def _build_price_url(self, symbol: str, vs_currency: str) -> str:
+        """
+        Build the CoinGecko simple price request URL.
+        
+        Args:
+            symbol: Cryptocurrency symbol, or a comma-separated list of symbols
+            vs_currency: Reference currency for pricing
+            
+        Returns:
+            Request URL with query string
+        """
+        return self._price_url_tmpl.format(ids=quote(symbol, safe=','), vs=quote(vs_currency))
+    
+    def _parse_price_response(self, symbol: str, vs_currency: str, data: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Format a CoinGecko price response and cache the result.
+        
+        Args:
+            symbol: Cryptocurrency symbol
+            vs_currency: Reference currency for pricing
+            data: Decoded API response
+            
+        Returns:
+            Market data dictionary
+        """
+        if symbol not in data:
+            raise ValueError(f"Symbol {symbol} not found")
+        
+        price_data = data[symbol]
+        result = {
+            'symbol': symbol.upper(),
+            'price': price_data.get(vs_currency, 0),
+            'price_change_percentage_24h': price_data.get(f'{vs_currency}_24h_change', 0),
+            'price_change_percentage_7d': price_data.get(f'{vs_currency}_7d_change', 0),
+            'vs_currency': vs_currency.upper(),
+            'timestamp': self._get_current_timestamp(),
+            'source': 'CoinGecko API',
+            'status': 'success'
+        }
+        self._cache_market_data((symbol, vs_currency), result)
+        return dict(result)
+    
+    def _get_cached_market_data(self, symbol: str, vs_currency: str) -> Optional[Dict[str, Any]]:
+        """
+        Look up fresh market data in the shared TTL cache.
+        
+        Args:
+            symbol: Cryptocurrency symbol
+            vs_currency: Reference currency for pricing
+            
+        Returns:
+            A copy of the cached market data, or None if missing or stale
+        """
+        cached = _MARKET_DATA_CACHE.get((symbol, vs_currency))
+        if cached and cached[0] > time.monotonic():
+            return dict(cached[1])
+        return None
+    
+    def _cache_market_data(self, key: Tuple[str, str], data: Dict[str, Any]):
+        """
+        Store fetched market data in the shared TTL cache.
+        
+        Args:
+            key: (symbol, vs_currency) cache key
+            data: Market data dictionary
+        """
+        # Drop the oldest entry once the cache is full
+        if key not in _MARKET_DATA_CACHE and len(_MARKET_DATA_CACHE) >= MARKET_DATA_CACHE_SIZE:
+            _MARKET_DATA_CACHE.pop(next(iter(_MARKET_DATA_CACHE)))
+        _MARKET_DATA_CACHE[key] = (time.monotonic() + MARKET_DATA_TTL, data)
+    
     def _get_mock_data(self, symbol: str, vs_currency: str) -> Dict[str, Any]:
         """
         Generate mock market data for demonstration purposes.
@@ -173,7 +647,6 @@ class MarketDataTool(BaseTool):
         price = mock_prices.get(symbol, 100.0)
         
         # Generate some random but realistic percentage changes
-        import random
         change_24h = round(random.uniform(-5.0, 5.0), 2)
         change_7d = round(random.uniform(-10.0, 10.0), 2)
         
@@ -201,76 +674,50 @@ class MarketDataTool(BaseTool):
         change_24h = data.get('price_change_percentage_24h', 0)
         change_7d = data.get('price_change_percentage_7d', 0)
         
-        # Determine market trend
-        if change_24h > 5 and change_7d > 10:
-            trend = 'bull_market'
-            trend_description = '强劲牛市'
-        elif change_24h > 0 and change_7d > 0:
-            trend = 'uptrend'
-            trend_description = '上升趋势'
-        elif change_24h < -5 and change_7d < -10:
-            trend = 'bear_market'
-            trend_description = '熊市'
-        elif change_24h < 0 and change_7d < 0:
-            trend = 'downtrend'
-            trend_description = '下降趋势'
-        else:
-            trend = 'sideways'
-            trend_description = '横盘整理'
-        
-        # Determine volatility
-        volatility = 'high' if abs(change_24h) > 3 else 'medium' if abs(change_24h) > 1 else 'low'
+        # Determine market trend and volatility as table indexes
+        trend_idx = self._classify_trend(change_24h, change_7d)
+        abs_change_24h = abs(change_24h)
+        volatility_idx = (abs_change_24h > 3) + (abs_change_24h > 1)
         
-        # Provide advice based on market state
-        advice = self._get_market_advice(trend, volatility)
-        
-        return {
-            'trend': trend,
-            'trend_description': trend_description,
-            'volatility': volatility,
-            'advice': advice
-        }
+        return dict(_MARKET_STATE_TABLE[trend_idx][volatility_idx])
     
-    def _get_market_advice(self, trend: str, volatility: str) -> str:
+    def analyze_batch(self, changes_24h: Sequence[float], changes_7d: Sequence[float]) -> List[Dict[str, Any]]:
         """
-        Generate market advice based on trend and volatility.
+        Analyze market state for many symbols at once.
         
         Args:
-            trend: Market trend
-            volatility: Market volatility level
+            changes_24h: 24h price change percentages, one per symbol
+            changes_7d: 7d price change percentages, one per symbol
             
         Returns:
-            Market advice string
+            Market state analysis for each symbol, in input order
         """
-        advice_map = {
-            'bull_market': {
-                'high': '牛市高波动，建议谨慎追高，考虑分批获利。',
-                'medium': '牛市中等波动，可适度跟进但保持风险控制。',
-                'low': '牛市低波动，可能预示更大上涨，关注成交量变化。'
-            },
-            'uptrend': {
-                'high': '上升趋势高波动，适合设置止损的逢低买入策略。',
-                'medium': '稳定上升趋势，适合定投策略。',
-                'low': '低波动上升，突破阻力位可能加速上涨。'
-            },
-            'bear_market': {
-                'high': '熊市高波动，建议观望或小仓位试探，严格止损。',
-                'medium': '熊市中等波动，耐心等待抄底机会，关注基本面。',
-                'low': '熊市低波动，可能即将出现方向性突破。'
-            },
-            'downtrend': {
-                'high': '下降趋势高波动，避免抄底，等待趋势反转信号。',
-                'medium': '稳定下降趋势，保持观望或考虑对冲策略。',
-                'low': '低波动下降，可能是下跌中继，谨慎操作。'
-            },
-            'sideways': {
-                'high': '横盘高波动，适合区间交易策略，关注突破方向。',
-                'medium': '横盘整理，等待明确方向，可少量布局。',
-                'low': '低波动横盘，即将选择方向，密切关注成交量变化。'
-            }
-        }
+        trend_idx, volatility_idx = classify_market_states(changes_24h, changes_7d)
+        return [
+            dict(_MARKET_STATE_TABLE[t][v])
+            for t, v in zip(trend_idx.tolist(), volatility_idx.tolist())
+        ]
+    
+    def _classify_trend(self, change_24h: float, change_7d: float) -> int:
+        """
+        Classify the market trend from price changes.
         
-        return advice_map.get(trend, {}).get(volatility, '市场状况不明，建议保持谨慎。')
+        Args:
+            change_24h: 24h price change percentage
+            change_7d: 7d price change percentage
+            
+        Returns:
+            Index into TRENDS
+        """
+        if change_24h > 5 and change_7d > 10:
+            return 0
+        if change_24h > 0 and change_7d > 0:
+            return 1
+        if change_24h < -5 and change_7d < -10:
+            return 2
+        if change_24h < 0 and change_7d < 0:
+            return 3
+        return 4
     
     def _get_current_timestamp(self) -> str:
         """
@@ -279,5 +726,4 @@ class MarketDataTool(BaseTool):
         Returns:
             ISO format timestamp string
         """
-        import datetime
         return datetime.datetime.now().isoformat()
@@ -10,9 +10,34 @@ including intent recognition and transaction parameter extraction.
 
 import re
 import json
+import datetime
 from typing import Dict, Any, Optional
 from qwen_agent.tools.base import BaseTool, register_tool
 
+# Amount shorthand such as "100u" or "2.5 u", meaning USDT
+_AMOUNT_RE = re.compile(r'(\d+(?:\.\d+)?)\s*u')
+
+# Common token symbols
+_COMMON_TOKENS = {
+    'btc': 'BTC', 'eth': 'ETH', 'usdt': 'USDT', 'usdc': 'USDC',
+    'bnb': 'BNB', 'sol': 'SOL', 'ada': 'ADA', 'dot': 'DOT',
+    'link': 'LINK', 'uni': 'UNI', 'aave': 'AAVE', 'mkr': 'MKR',
+    'doge': 'DOGE', 'shib': 'SHIB', 'avax': 'AVAX', 'xrp': 'XRP',
+    'u': 'USDT',  # Common shorthand for USDT
+    '100u': '100 USDT',  # Handle common patterns
+}
+
+# Map common chain abbreviations to full names
+_CHAIN_MAP = {
+    'eth': 'Ethereum',
+    'btc': 'Bitcoin',
+    'bsc': 'BSC',
+    'polygon': 'Polygon',
+    'matic': 'Polygon',
+    'avax': 'Avalanche',
+    'sol': 'Solana'
+}
+
 @register_tool('parse_swap_intent')
 class SwapIntentTool(BaseTool):
     """
@@ -46,27 +71,6 @@ class SwapIntentTool(BaseTool):
         "required": ["tkBuy", "tkSell", "count"]
     }
     
-    def __init__(self):
-        """Initialize the swap intent parsing tool."""
-        super().__init__()
-        # Define common token symbols
-        self.common_tokens = {
-            'btc': 'BTC', 'eth': 'ETH', 'usdt': 'USDT', 'usdc': 'USDC',
-            'bnb': 'BNB', 'sol': 'SOL', 'ada': 'ADA', 'dot': 'DOT',
-            'link': 'LINK', 'uni': 'UNI', 'aave': 'AAVE', 'mkr': 'MKR',
-            'doge': 'DOGE', 'shib': 'SHIB', 'avax': 'AVAX', 'xrp': 'XRP',
-            'u': 'USDT',  # Common shorthand for USDT
-            '100u': '100 USDT',  # Handle common patterns
-        }
-        
-        # Define common blockchain names
-        self.common_chains = [
-            'ethereum', 'eth', 'btc', 'bitcoin', 'bsc', 'binance smart chain',
-            'polygon', 'matic', 'avalanche', 'avax', 'solana', 'sol', 'optimism',
-            'arbitrum', 'fantom', 'ftm', 'near', 'cosmos', 'atom', 'algorand',
-            'algo', 'cardano', 'ada', 'polkadot', 'dot', 'chainlink', 'link'
-        ]
-    
     def call(self, params: Dict[str, Any]) -> str:
         """
         Execute the swap intent parsing tool.
@@ -163,12 +167,11 @@ class SwapIntentTool(BaseTool):
         token_lower = token.lower().strip()
         
         # Check if it's in our common tokens mapping
-        if token_lower in self.common_tokens:
-            return self.common_tokens[token_lower]
+        if token_lower in _COMMON_TOKENS:
+            return _COMMON_TOKENS[token_lower]
         
         # Handle special case for "100u" or similar patterns
-        amount_match = re.search(r'(\\d+(?:\\.\\d+)?)\s*u', token_lower)
-        if amount_match:
+        if _AMOUNT_RE.fullmatch(token_lower):
             return 'USDT'
         
         # Otherwise, just capitalize the first letter of each part
@@ -191,20 +194,9 @@ class SwapIntentTool(BaseTool):
         if not chain_lower:
             return 'default'  # Use default chain if not specified
         
-        # Map common abbreviations to full names
-        chain_mapping = {
-            'eth': 'Ethereum',
-            'btc': 'Bitcoin',
-            'bsc': 'BSC',
-            'polygon': 'Polygon',
-            'matic': 'Polygon',
-            'avax': 'Avalanche',
-            'sol': 'Solana'
-        }
-        
         # Check if chain is in our mapping
-        if chain_lower in chain_mapping:
-            return chain_mapping[chain_lower]
+        if chain_lower in _CHAIN_MAP:
+            return _CHAIN_MAP[chain_lower]
         
         # Return the original with proper capitalization
         return chain_lower.capitalize()
@@ -216,5 +208,4 @@ class SwapIntentTool(BaseTool):
         Returns:
             ISO format timestamp string
         """
-        import datetime
         return datetime.datetime.now().isoformat()
@@ -9,11 +9,16 @@ Provides HTTP interfaces for processing user intents and executing blockchain op
 """
 
 import os
-import json
+import re
+import asyncio
+from contextlib import asynccontextmanager
+from functools import lru_cache
 from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import JSONResponse, ORJSONResponse
 from typing import Dict, Any, List, Optional
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from dotenv import load_dotenv
 
 # Load environment variables
@@ -23,14 +28,22 @@ load_dotenv()
 from agents.swap_agent import SwapAgent
 from agents.mental_support_agent import MentalSupportAgent
 from agents.dca_agent import DCAAgent
-from agents.tools.market_tools import MarketDataTool
+from agents.tools.market_tools import MarketDataTool, aclose_async_client
 from agents.tools.contract_tools import ContractTool
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Close the market data HTTP client of the application's event loop on shutdown."""
+    yield
+    await aclose_async_client()
+
 # Initialize FastAPI application
 app = FastAPI(
     title="HODL Box API",
     description="API for HODL Box AI Agent - Cryptocurrency Investment, DCA, and Mental Support",
-    version="1.0.0"
+    version="1.0.0",
+    default_response_class=ORJSONResponse,
+    lifespan=lifespan
 )
 
 # Add CORS middleware
@@ -42,12 +55,76 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Initialize agents
-swap_agent = SwapAgent()
-mental_support_agent = MentalSupportAgent()
-dca_agent = DCAAgent()
-market_tool = MarketDataTool()
-contract_tool = ContractTool()
+# Compress larger JSON responses; repetitive Chinese advice text shrinks well
+app.add_middleware(GZipMiddleware, minimum_size=500)
+
+# Agents and tools are created on first use and then shared, so each worker
+# only builds the ones its endpoints need. Their calls block on network I/O,
+# so endpoints run them in worker threads to keep the event loop free and
+# let different agents overlap.
+@lru_cache(maxsize=1)
+def get_swap_agent() -> SwapAgent:
+    """Get the shared SwapAgent instance."""
+    return SwapAgent()
+
+@lru_cache(maxsize=1)
+def get_mental_support_agent() -> MentalSupportAgent:
+    """Get the shared MentalSupportAgent instance."""
+    return MentalSupportAgent()
+
+@lru_cache(maxsize=1)
+def get_dca_agent() -> DCAAgent:
+    """Get the shared DCAAgent instance."""
+    return DCAAgent()
+
+@lru_cache(maxsize=1)
+def get_market_tool() -> MarketDataTool:
+    """Get the shared MarketDataTool instance."""
+    return MarketDataTool()
+
+@lru_cache(maxsize=1)
+def get_contract_tool() -> ContractTool:
+    """Get the shared ContractTool instance."""
+    return ContractTool()
+
+# Chat routing keywords, checked in priority order
+CHAT_ROUTES = (
+    ("dca", ("定投", "dca", "invest", "auto buy")),
+    ("swap", ("换", "交换", "swap", "buy", "sell", "买", "卖")),
+    ("mental_support", ("心情", "焦虑", "担心", "恐惧", "支持", "鼓励")),
+    ("market_data", ("价格", "市场", "行情", "price", "market", "trend")),
+)
+
+# One compiled alternation per route, so each route is a single scan, plus the
+# first characters of its keywords so routes that cannot match are skipped
+_CHAT_ROUTE_PATTERNS = tuple(
+    (route, frozenset(keyword[0] for keyword in keywords), re.compile("|".join(map(re.escape, keywords))))
+    for route, keywords in CHAT_ROUTES
+)
+
+# Candidate cryptocurrency symbol in a market data chat message
+_SYMBOL_RE = re.compile(r'[a-zA-Z]{2,5}')
+
+def route_chat_message(message_lower: str) -> Optional[str]:
+    """
+    Pick the chat route for a lowercased message.
+    
+    Args:
+        message_lower: The user's message in lowercase
+        
+    Returns:
+        Route name, or None if no route matches
+    """
+    present = set(message_lower)
+    for route, first_chars, pattern in _CHAT_ROUTE_PATTERNS:
+        if first_chars.isdisjoint(present):
+            continue
+        if pattern.search(message_lower):
+            return route
+    return None
+
+# Most symbols accepted by one batch market data request
+MAX_BATCH_SYMBOLS = 50
 
 # Request and response models
 class SwapRequest(BaseModel):
@@ -70,6 +147,12 @@ class MarketDataRequest(BaseModel):
     vs_currency: Optional[str] = "USD"
     include_market_state: Optional[bool] = True
 
+class MarketDataBatchRequest(BaseModel):
+    """Model for multi-symbol market data request."""
+    symbols: List[str] = Field(max_length=MAX_BATCH_SYMBOLS)
+    vs_currency: Optional[str] = "USD"
+    include_market_state: Optional[bool] = True
+
 class ContractCallRequest(BaseModel):
     """Model for smart contract call request."""
     contract_address: str
@@ -112,7 +195,7 @@ async def process_swap_request(request: SwapRequest):
             full_message += f" (在{request.chain}链上)"
         
         # Process the swap request
-        result = swap_agent.process_swap_request(full_message)
+        result = await asyncio.to_thread(get_swap_agent().process_swap_request, full_message)
         
         return ResponseModel(
             status="success",
@@ -128,7 +211,7 @@ async def process_dca_request(request: DCARequest):
     Process a DCA request.
     """
     try:
-        result = dca_agent.process_dca_request(request.message)
+        result = await asyncio.to_thread(get_dca_agent().process_dca_request, request.message)
         return ResponseModel(status="success", data=result)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -146,7 +229,8 @@ async def provide_mental_support(request: MentalSupportRequest):
     """
     try:
         # Provide mental support based on message and market state
-        result = mental_support_agent.provide_support(
+        result = await asyncio.to_thread(
+            get_mental_support_agent().provide_support,
             request.message,
             request.market_state
         )
@@ -179,8 +263,7 @@ async def get_market_data(request: MarketDataRequest):
         }
         
         # Call market data tool
-        result_json = market_tool.call(params)
-        result = json.loads(result_json)
+        result = await get_market_tool().acall_dict(params)
         
         # Check for errors in the result
         if result.get("status") == "error":
@@ -196,7 +279,37 @@ async def get_market_data(request: MarketDataRequest):
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-@app.post("/api/contract-call", response_model=ResponseModel)
+@app.post("/api/market-data/batch", response_model=ResponseModel)
+async def get_market_data_batch(request: MarketDataBatchRequest):
+    """
+    Fetch cryptocurrency market data for several symbols at once.
+    
+    Args:
+        request: MarketDataBatchRequest containing symbols and optional parameters
+        
+    Returns:
+        ResponseModel with a list of market data, one entry per symbol
+    """
+    if not any(request.symbols):
+        raise HTTPException(status_code=400, detail="At least one symbol is required")
+    
+    try:
+        results = await get_market_tool().abatch_call(
+            request.symbols,
+            request.vs_currency,
+            request.include_market_state
+        )
+        
+        return ResponseModel(
+            status="success",
+            data={"results": results}
+        )
+        
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+# uint256 results can exceed the 64-bit integers orjson serializes
+@app.post("/api/contract-call", response_model=ResponseModel, response_class=JSONResponse)
 async def execute_contract_call(request: ContractCallRequest):
     """
     Execute a smart contract call.
@@ -222,8 +335,7 @@ async def execute_contract_call(request: ContractCallRequest):
             params["abi"] = request.abi
         
         # Call contract tool
-        result_json = contract_tool.call(params)
-        result = json.loads(result_json)
+        result = await asyncio.to_thread(get_contract_tool().call_dict, params)
         
         # Check for errors in the result
         if result.get("status") == "error":
@@ -260,37 +372,36 @@ async def chat_endpoint(request: Request):
         
         # Simple routing logic based on message content
         message_lower = message.lower()
+        route = route_chat_message(message_lower)
         
-        if any(keyword in message_lower for keyword in ["定投", "dca", "invest", "auto buy"]):
+        if route == "dca":
             # Route to DCA agent
-            result = dca_agent.process_dca_request(message)
+            result = await asyncio.to_thread(get_dca_agent().process_dca_request, message)
             return {
                 "type": "dca",
                 "response": result
             }
-        elif any(keyword in message_lower for keyword in ["换", "交换", "swap", "buy", "sell", "买", "卖"]):
+        elif route == "swap":
             # Route to swap agent
-            result = swap_agent.process_swap_request(message)
+            result = await asyncio.to_thread(get_swap_agent().process_swap_request, message)
             return {
                 "type": "swap",
                 "response": result
             }
-        elif any(keyword in message_lower for keyword in ["心情", "焦虑", "担心", "恐惧", "支持", "鼓励"]):
+        elif route == "mental_support":
             # Route to mental support agent
-            result = mental_support_agent.provide_support(message)
+            result = await asyncio.to_thread(get_mental_support_agent().provide_support, message)
             return {
                 "type": "mental_support",
                 "response": result
             }
-        elif any(keyword in message_lower for keyword in ["价格", "市场", "行情", "price", "market", "trend"]):
+        elif route == "market_data":
             # Try to extract symbol for market data
-            import re
-            symbol_match = re.search(r'[a-zA-Z]{2,5}', message_lower)
+            symbol_match = _SYMBOL_RE.search(message_lower)
             if symbol_match:
                 symbol = symbol_match.group(0)
                 params = {"symbol": symbol}
-                result_json = market_tool.call(params)
-                result = json.loads(result_json)
+                result = await get_market_tool().acall_dict(params)
                 return {
                     "type": "market_data",
                     "response": result
@@ -310,6 +421,8 @@ async def chat_endpoint(request: Request):
                 }
             }
             
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -321,12 +434,15 @@ def run_server():
     port = int(os.getenv("APP_PORT", "8000"))
     debug = os.getenv("DEBUG", "False").lower() == "true"
     
-    # Run the server
+    # Run the server on the C HTTP parser; the "auto" loop picks uvloop
+    # wherever it is installed (it is unavailable on Windows)
     uvicorn.run(
         "api:app",
         host="0.0.0.0",
         port=port,
-        reload=debug
+        reload=debug,
+        loop="auto",
+        http="httptools"
     )
 
 if __name__ == "__main__":
@@ -0,0 +1,49 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+HODL Box 测试公共配置
+
+api和FastAPI只在fixture中导入，收集测试（如-k筛选、--collect-only）时无需加载。
+"""
+
+import importlib.util
+import os
+import pytest
+
+# 关闭OpenTelemetry等请求追踪，必须在导入api之前设置
+os.environ.setdefault("OTEL_SDK_DISABLED", "true")
+os.environ.setdefault("OTEL_PYTHON_DISABLED_INSTRUMENTATIONS", "fastapi,requests,urllib,urllib3")
+
+# TestClient固定使用asyncio后端；安装了uvloop（uvicorn[standard]在非Windows平台自带）时使用uvloop事件循环
+_TEST_CLIENT_BACKEND_OPTIONS = {"use_uvloop": importlib.util.find_spec("uvloop") is not None}
+
+@pytest.fixture(scope="session")
+def api_module():
+    """导入被测试的api模块。"""
+    import api
+    return api
+
+@pytest.fixture(scope="session")
+def app(api_module):
+    """被测试的FastAPI应用。"""
+    return api_module.app
+
+@pytest.fixture(scope="session")
+def client(app):
+    """整个测试会话共用的测试客户端，应用的启动和关闭只执行一次，所有请求共用同一个事件循环。"""
+    from fastapi.testclient import TestClient
+    with TestClient(app, backend="asyncio", backend_options=_TEST_CLIENT_BACKEND_OPTIONS) as test_client:
+        yield test_client
+
+# api中用lru_cache缓存的Agent和工具工厂函数
+_API_FACTORIES = ("get_swap_agent", "get_mental_support_agent", "get_dca_agent", "get_market_tool", "get_contract_tool")
+
+@pytest.fixture
+def api_factories(api_module):
+    """在测试前后清空工厂函数的缓存，避免某个测试创建或替换的实例泄漏到其他测试中。"""
+    for name in _API_FACTORIES:
+        getattr(api_module, name).cache_clear()
+    yield api_module
+    for name in _API_FACTORIES:
+        getattr(api_module, name).cache_clear()
@@ -8,17 +8,28 @@ HODL Box Agent - 韭菜罐子智能心理按摩助手
 """
 
 import os
-import json
+import time
+import atexit
+import random
+import asyncio
+import hashlib
 import logging
+import weakref
 import datetime
-from typing import Dict, List, Optional, Any
+import functools
+from collections import deque
+from typing import TYPE_CHECKING, AsyncIterator, Dict, List, Optional, Any, Tuple
 
+import httpx
 from dotenv import load_dotenv
-from openai import OpenAI
-import pandas as pd
-import matplotlib.pyplot as plt
-from telegram import Update
-from telegram.ext import Application, CommandHandler, MessageHandler, filters, ContextTypes
+from openai import AsyncOpenAI
+import orjson
+
+from agents.response_cache import ResponseCache
+
+if TYPE_CHECKING:
+    from telegram import Update
+    from telegram.ext import ContextTypes
 
 # 配置日志
 logging.basicConfig(
@@ -30,8 +41,148 @@ logger = logging.getLogger(__name__)
 # 加载环境变量
 load_dotenv()
 
-# 初始化OpenAI客户端
-openai_client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+# OpenAI请求共用的HTTP连接池（HTTP/2下并发请求复用同一个连接）和OpenAI客户端，
+# 在事件循环中首次使用时创建，使连接池绑定到实际运行的事件循环
+_HTTP_CLIENT: Optional[httpx.AsyncClient] = None
+_OPENAI_CLIENT: Optional[AsyncOpenAI] = None
+
+def get_openai_client() -> AsyncOpenAI:
+    """
+    获取共用的OpenAI客户端，首次调用时创建，异步调用使不同用户的请求可以并发
+    
+    Returns:
+        AsyncOpenAI实例
+    """
+    global _HTTP_CLIENT, _OPENAI_CLIENT
+    if _OPENAI_CLIENT is None:
+        _HTTP_CLIENT = httpx.AsyncClient(
+            http2=True,
+            limits=httpx.Limits(max_connections=100, max_keepalive_connections=50),
+            timeout=httpx.Timeout(30.0, connect=5.0)
+        )
+        _OPENAI_CLIENT = AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"), http_client=_HTTP_CLIENT)
+    return _OPENAI_CLIENT
+
+async def close_http_client(*_):
+    """
+    关闭OpenAI请求共用的HTTP连接池，程序退出前在同一事件循环中调用；之后再使用时重新创建
+    """
+    global _HTTP_CLIENT, _OPENAI_CLIENT
+    http_client, _HTTP_CLIENT, _OPENAI_CLIENT = _HTTP_CLIENT, None, None
+    if http_client is not None:
+        await http_client.aclose()
+
+# 重复请求的回复缓存，命中时无需再次调用API
+_CHAT_CACHE = ResponseCache(max_size=4096)
+
+# 市场洞察与用户无关，短时间内直接复用
+MARKET_INSIGHT_TTL = 60
+_MARKET_INSIGHT_CACHE = ResponseCache(max_size=1, ttl=MARKET_INSIGHT_TTL)
+
+async def cached_chat(system: str, user: str, cache: ResponseCache = _CHAT_CACHE,
+                      model: str = "gpt-3.5-turbo", **kwargs) -> str:
+    """
+    调用OpenAI对话接口，相同的模型、参数、系统提示和用户消息直接返回缓存结果
+    
+    Args:
+        system: 系统提示
+        user: 用户消息
+        cache: 使用的缓存
+        model: 模型名称
+        **kwargs: 其他请求参数，如max_tokens、temperature
+    
+    Returns:
+        回复内容
+    """
+    namespace = _chat_cache_namespace(system, model, tuple(sorted(kwargs.items())))
+    cached = cache.get(user, namespace)
+    if cached is not None:
+        return cached
+    
+    response = await get_openai_client().chat.completions.create(
+        model=model,
+        messages=[
+            {"role": "system", "content": system},
+            {"role": "user", "content": user}
+        ],
+        **kwargs
+    )
+    content = response.choices[0].message.content.strip()
+    cache.set(user, content, namespace)
+    return content
+
+async def stream_chat(system: str, user: str, cache: ResponseCache = _CHAT_CACHE,
+                      model: str = "gpt-3.5-turbo", **kwargs) -> AsyncIterator[str]:
+    """
+    流式调用OpenAI对话接口，边生成边返回内容片段，与cached_chat共用缓存
+    
+    Args:
+        system: 系统提示
+        user: 用户消息
+        cache: 使用的缓存
+        model: 模型名称
+        **kwargs: 其他请求参数，如temperature
+    
+    Yields:
+        回复内容片段
+    """
+    namespace = _chat_cache_namespace(system, model, tuple(sorted(kwargs.items())))
+    cached = cache.get(user, namespace)
+    if cached is not None:
+        yield cached
+        return
+    
+    stream = await get_openai_client().chat.completions.create(
+        model=model,
+        messages=[
+            {"role": "system", "content": system},
+            {"role": "user", "content": user}
+        ],
+        stream=True,
+        **kwargs
+    )
+    parts = []
+    async for chunk in stream:
+        if chunk.choices and chunk.choices[0].delta.content:
+            parts.append(chunk.choices[0].delta.content)
+            yield parts[-1]
+    cache.set(user, "".join(parts).strip(), namespace)
+
+@functools.lru_cache(maxsize=256)
+def _chat_cache_namespace(system: str, model: str, kwargs: Tuple[Tuple[str, Any], ...]) -> str:
+    """
+    计算对话缓存的命名空间：模型、请求参数和系统提示相同的请求共用
+    
+    固定的系统提示只在第一次使用时计算哈希
+    
+    Args:
+        system: 系统提示
+        model: 模型名称
+        kwargs: 排序后的其他请求参数
+    
+    Returns:
+        命名空间字符串
+    """
+    return hashlib.sha1(f"{model}|{list(kwargs)}|{system}".encode("utf-8")).hexdigest()
+
+# 用户配置快照文件，以及记录快照之后每次修改的追加日志
+USER_PROFILES_PATH = "user_profiles.json"
+USER_PROFILES_JOURNAL_PATH = "user_profiles.jsonl"
+
+# 每个用户保留的最近情绪记录条数
+MOOD_HISTORY_LIMIT = 200
+
+# 批量生成报告时同时进行的API请求数上限
+REPORT_CONCURRENCY = 20
+
+# 离线批量生成报告时查询OpenAI Batch任务状态的间隔（秒）
+BATCH_POLL_INTERVAL = 60
+
+# 退出时等待正在处理的消息任务完成的最长时间（秒），超时后取消
+TASK_SHUTDOWN_TIMEOUT = 10
+
+# 市场状态对所有用户相同，在此时间（秒）内共用同一结果
+MARKET_STATE_TTL = 30
 
 # 定义市场状态
 MARKET_STATES = {
@@ -40,6 +191,31 @@ MARKET_STATES = {
     "SIDE": "横盘",
     "VOLATILE": "剧烈波动"
 }
+_MARKET_STATE_LIST = list(MARKET_STATES.values())
+
+# 激励性回应的系统提示模板
+_MOTIVATION_SYSTEM_TEMPLATE = """
+先在JSON中输出情绪标签emotion(从[焦虑,恐惧,贪婪,平静,沮丧,兴奋]中选一个)，再输出reply字段，≤150字。严格输出JSON，格式为{{"emotion": "...", "reply": "..."}}。
+
+你是韭菜罐子(HODL Box)的心理按摩助手，专门帮助加密货币投资者坚持他们的投资计划，尤其是在市场波动期间。
+
+用户信息：
+- 姓名：{name}
+- 风险偏好：{risk_profile}
+- 投资目标：{investment_goal}
+- 当前市场状态：{market_state}
+
+投资计划：{investment_plan}
+
+请先判断用户消息中的情绪，再根据用户的情况，生成一个富有同理心、鼓励性且专业的回应。
+回应应该：
+1. 先共情用户当前的情绪
+2. 提供符合用户风险偏好的专业建议
+3. 强调长期投资和定投策略的好处
+4. 用简单易懂的语言解释市场波动的必然性
+5. 鼓励用户坚持他们的投资计划
+6. 回应要温暖、专业且简短，不超过150字
+"""
 
 # 定义用户情绪
 USER_EMOTIONS = {
@@ -50,6 +226,39 @@ USER_EMOTIONS = {
     "FRUSTRATED": "沮丧",
     "EXCITED": "兴奋"
 }
+_EMOTION_SET = frozenset(USER_EMOTIONS.values())
+
+# 含义明确的情绪关键词，命中时无需调用API分析情绪；按顺序匹配，先出现的优先
+_EMOTION_KEYWORDS = {
+    "害怕": "恐惧",
+    "恐惧": "恐惧",
+    "恐慌": "恐惧",
+    "焦虑": "焦虑",
+    "担心": "焦虑",
+    "紧张": "焦虑",
+    "沮丧": "沮丧",
+    "失望": "沮丧",
+    "后悔": "沮丧",
+    "贪婪": "贪婪",
+    "梭哈": "贪婪",
+    "兴奋": "兴奋",
+    "激动": "兴奋",
+}
+
+def _match_emotion_keyword(message: str) -> Optional[str]:
+    """
+    用关键词快速判断情绪
+    
+    Args:
+        message: 用户消息
+    
+    Returns:
+        情绪类型，没有命中关键词时返回None
+    """
+    for keyword, emotion in _EMOTION_KEYWORDS.items():
+        if keyword in message:
+            return emotion
+    return None
 
 class HODLBoxAgent:
     """
@@ -61,8 +270,22 @@ class HODLBoxAgent:
         初始化HODL Box助手
         """
         self.user_profiles = {}
+        # 序列化后的投资计划，按用户ID缓存在内存中，不随用户配置保存
+        self._plan_json: Dict[str, Optional[str]] = {}
+        self._journal = None
+        # 最近一条修改日志的序号，快照记录保存时的序号，重放时跳过快照已包含的记录
+        self._journal_seq = 0
+        # 每个用户一把锁：同一用户的消息按顺序处理，不同用户之间并发；
+        # 锁只在有消息正在处理或等待时被引用，之后自动从字典中移除
+        self._user_locks: "weakref.WeakValueDictionary[str, asyncio.Lock]" = weakref.WeakValueDictionary()
+        # 正在处理的Telegram消息任务，保持引用以免被回收
+        self._tasks = set()
+        # 市场状态缓存：(获取时间, 市场状态)
+        self._market_state_cache = (0.0, None)
         self.load_user_profiles()
         self.positive_quotes = self._load_positive_quotes()
+        # 退出时把日志合并回快照；close()会取消注册，每个实例只合并一次
+        atexit.register(self.close)
     
     def _load_positive_quotes(self) -> List[str]:
         """
@@ -83,25 +306,173 @@ class HODLBoxAgent:
     
     def load_user_profiles(self):
         """
-        加载用户配置文件
+        加载用户配置文件：先读取快照，再重放快照之后的修改日志
         """
+        snapshot_seq = 0
         try:
-            if os.path.exists("user_profiles.json"):
-                with open("user_profiles.json", "r", encoding="utf-8") as f:
-                    self.user_profiles = json.load(f)
+            if os.path.exists(USER_PROFILES_PATH):
+                with open(USER_PROFILES_PATH, "rb") as f:
+                    snapshot = orjson.loads(f.read())
+                if "profiles" in snapshot and "seq" in snapshot:
+                    self.user_profiles, snapshot_seq = snapshot["profiles"], snapshot["seq"]
+                else:
+                    # 旧版本的快照直接保存用户配置，没有序号
+                    self.user_profiles = snapshot
+            for user_profile in self.user_profiles.values():
+                self._bound_mood_history(user_profile)
+                # 旧版本会把序列化缓存一起写入快照
+                user_profile.pop("_plan_json", None)
         except Exception as e:
             logger.error(f"加载用户配置文件时出错: {e}")
             self.user_profiles = {}
+        self._journal_seq = snapshot_seq
+        
+        try:
+            if os.path.exists(USER_PROFILES_JOURNAL_PATH):
+                with open(USER_PROFILES_JOURNAL_PATH, "rb") as f:
+                    for line in f:
+                        try:
+                            entry = orjson.loads(line)
+                        except ValueError:
+                            # 跳过写入中断留下的不完整记录
+                            logger.warning(f"跳过无法解析的用户配置日志: {line!r}")
+                            continue
+                        # 快照写入后、日志清空前中断时，日志中的记录已包含在快照里
+                        seq = entry.get("seq", 0)
+                        if seq and seq <= snapshot_seq:
+                            continue
+                        self._apply_journal_entry(entry)
+                        self._journal_seq = max(self._journal_seq, seq)
+        except Exception as e:
+            logger.error(f"重放用户配置日志时出错: {e}")
     
-    def save_user_profiles(self):
+    def save_user_profiles(self) -> bool:
         """
-        保存用户配置文件
+        保存用户配置文件快照：先写入临时文件，再原子替换旧快照，写入中断不会损坏已有快照
+        
+        快照同时记录最近一条修改日志的序号，加载时跳过已包含在快照中的日志记录
+        
+        Returns:
+            是否保存成功
         """
+        tmp_path = USER_PROFILES_PATH + ".tmp"
         try:
-            with open("user_profiles.json", "w", encoding="utf-8") as f:
-                json.dump(self.user_profiles, f, ensure_ascii=False, indent=4)
+            with open(tmp_path, "wb") as f:
+                f.write(orjson.dumps(
+                    {"seq": self._journal_seq, "profiles": self.user_profiles},
+                    default=list,
+                    option=orjson.OPT_NON_STR_KEYS
+                ))
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, USER_PROFILES_PATH)
+            return True
         except Exception as e:
             logger.error(f"保存用户配置文件时出错: {e}")
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            return False
+    
+    def compact(self):
+        """
+        将修改日志合并进快照，并清空日志；快照保存失败时保留日志
+        """
+        if self._journal is None and not os.path.exists(USER_PROFILES_JOURNAL_PATH):
+            return
+        
+        if not self.save_user_profiles():
+            return
+        try:
+            if self._journal is not None:
+                self._journal.close()
+                self._journal = None
+            open(USER_PROFILES_JOURNAL_PATH, "w", encoding="utf-8").close()
+        except Exception as e:
+            logger.error(f"清空用户配置日志时出错: {e}")
+    
+    def close(self):
+        """
+        合并日志并关闭，同时取消退出时的自动合并
+        """
+        atexit.unregister(self.close)
+        self.compact()
+    
+    def _append_journal(self, entry: Dict[str, Any]):
+        """
+        向用户配置日志追加一条修改记录，写入量只与本次修改有关；每条记录带有递增的序号
+        
+        Args:
+            entry: 修改记录
+        """
+        self._journal_seq += 1
+        entry["seq"] = self._journal_seq
+        try:
+            if self._journal is None:
+                self._journal = open(USER_PROFILES_JOURNAL_PATH, "ab")
+            self._journal.write(orjson.dumps(entry, default=list, option=orjson.OPT_APPEND_NEWLINE))
+            self._journal.flush()
+        except Exception as e:
+            logger.error(f"写入用户配置日志时出错: {e}")
+    
+    def _bound_mood_history(self, user_profile: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        将情绪记录转换为定长队列，只保留最近MOOD_HISTORY_LIMIT条
+        
+        Args:
+            user_profile: 用户配置
+        
+        Returns:
+            同一个用户配置
+        """
+        user_profile["mood_history"] = deque(user_profile.get("mood_history", ()), maxlen=MOOD_HISTORY_LIMIT)
+        return user_profile
+    
+    def _get_plan_json(self, user_id: str) -> Optional[str]:
+        """
+        获取序列化后的投资计划，首次获取时序列化并缓存，生成回应时无需每次重新序列化
+        
+        Args:
+            user_id: 用户ID
+        
+        Returns:
+            投资计划JSON，没有投资计划时返回None
+        """
+        if user_id not in self._plan_json:
+            plan = self.user_profiles.get(user_id, {}).get("investment_plan")
+            self._plan_json[user_id] = orjson.dumps(plan).decode() if plan else None
+        return self._plan_json[user_id]
+    
+    def _apply_journal_entry(self, entry: Dict[str, Any]):
+        """
+        将一条修改记录应用到内存中的用户配置
+        
+        Args:
+            entry: 修改记录
+        """
+        op = entry["op"]
+        user_id = entry["uid"]
+        
+        if op == "create_profile":
+            self.user_profiles[user_id] = self._bound_mood_history(entry["profile"])
+            self._plan_json.pop(user_id, None)
+            return
+        
+        user_profile = self.user_profiles.get(user_id)
+        if user_profile is None:
+            return
+        
+        if op == "update_plan":
+            user_profile["investment_plan"] = entry["plan"]
+            self._plan_json.pop(user_id, None)
+            user_profile["last_interaction"] = entry["timestamp"]
+        elif op == "report":
+            user_profile["last_report"] = {"timestamp": entry["timestamp"], "content": entry["content"]}
+        elif op == "mood_append":
+            user_profile["motivational_boosts"] += 1
+            user_profile["last_interaction"] = entry["entry"]["timestamp"]
+            user_profile["mood_history"].append(entry["entry"])
     
     def create_user_profile(self, user_id: str, name: str, risk_profile: str, investment_goal: str):
         """
@@ -113,17 +484,18 @@ class HODLBoxAgent:
             risk_profile: 风险偏好
             investment_goal: 投资目标
         """
+        now_iso = datetime.datetime.now().isoformat()
         self.user_profiles[user_id] = {
             "name": name,
             "risk_profile": risk_profile,
             "investment_goal": investment_goal,
-            "created_at": datetime.datetime.now().isoformat(),
-            "last_interaction": datetime.datetime.now().isoformat(),
+            "created_at": now_iso,
+            "last_interaction": now_iso,
             "investment_plan": None,
-            "mood_history": [],
+            "mood_history": deque(maxlen=MOOD_HISTORY_LIMIT),
             "motivational_boosts": 0
         }
-        self.save_user_profiles()
+        self._append_journal({"op": "create_profile", "uid": user_id, "profile": self.user_profiles[user_id]})
     
     def update_investment_plan(self, user_id: str, plan: Dict[str, Any]):
         """
@@ -134,11 +506,16 @@ class HODLBoxAgent:
             plan: 投资计划详情
         """
         if user_id in self.user_profiles:
-            self.user_profiles[user_id]["investment_plan"] = plan
-            self.user_profiles[user_id]["last_interaction"] = datetime.datetime.now().isoformat()
-            self.save_user_profiles()
+            entry = {
+                "op": "update_plan",
+                "uid": user_id,
+                "plan": plan,
+                "timestamp": datetime.datetime.now().isoformat()
+            }
+            self._apply_journal_entry(entry)
+            self._append_journal(entry)
     
-    def analyze_user_emotion(self, message: str) -> str:
+    async def analyze_user_emotion(self, message: str) -> str:
         """
         分析用户情绪
         
@@ -148,43 +525,98 @@ class HODLBoxAgent:
         Returns:
             情绪类型
         """
+        emotion = _match_emotion_keyword(message)
+        if emotion is not None:
+            return emotion
+        
         try:
             # 使用OpenAI API进行情绪分析
-            response = openai_client.chat.completions.create(
+            emotion = await cached_chat(
+                "你是一个专业的情绪分析助手。请分析用户的最后一条消息，判断用户当前的情绪状态，只能从以下选项中选择一个：焦虑、恐惧、贪婪、平静、沮丧、兴奋。请直接返回情绪类型，不要添加任何其他内容。",
+                message,
+                max_tokens=5,
+                temperature=0
+            )
+            return emotion if emotion in _EMOTION_SET else "平静"
+        except Exception as e:
+            logger.error(f"情绪分析出错: {e}")
+            return "平静"
+    
+    async def analyze_user_emotions_batch(self, messages: List[str]) -> List[str]:
+        """
+        批量分析多条用户消息的情绪，只调用一次API
+        
+        Args:
+            messages: 用户消息列表
+        
+        Returns:
+            情绪类型列表，与消息一一对应
+        """
+        # 命中关键词的消息无需发送给API
+        emotions = [_match_emotion_keyword(message) for message in messages]
+        pending = [i for i, emotion in enumerate(emotions) if emotion is None]
+        if not pending:
+            return emotions
+        
+        for i, emotion in zip(pending, await self._analyze_emotions_api([messages[i] for i in pending])):
+            emotions[i] = emotion
+        return emotions
+    
+    async def _analyze_emotions_api(self, messages: List[str]) -> List[str]:
+        """
+        调用一次API批量分析多条消息的情绪
+        
+        Args:
+            messages: 用户消息列表
+        
+        Returns:
+            情绪类型列表，与消息一一对应
+        """
+        try:
+            numbered_messages = "\n".join(f"{i}. {message}" for i, message in enumerate(messages, 1))
+            response = await get_openai_client().chat.completions.create(
                 model="gpt-3.5-turbo",
                 messages=[
-                    {"role": "system", "content": "你是一个专业的情绪分析助手。请分析用户的最后一条消息，判断用户当前的情绪状态，只能从以下选项中选择一个：焦虑、恐惧、贪婪、平静、沮丧、兴奋。请直接返回情绪类型，不要添加任何其他内容。"},
-                    {"role": "user", "content": message}
+                    {"role": "system", "content": f"你是一个专业的情绪分析助手。用户会发送{len(messages)}条编号的消息，请分别判断每条消息的情绪状态，每条只能从以下选项中选择一个：焦虑、恐惧、贪婪、平静、沮丧、兴奋。请按编号顺序只返回一个长度为{len(messages)}的JSON数组，例如[\"焦虑\", \"平静\"]，不要添加任何其他内容。"},
+                    {"role": "user", "content": numbered_messages}
                 ],
-                max_tokens=5,
+                max_tokens=8 * len(messages) + 10,
                 temperature=0
             )
             
-            emotion = response.choices[0].message.content.strip()
-            return emotion if emotion in USER_EMOTIONS.values() else "平静"
+            emotions = orjson.loads(response.choices[0].message.content)
+            if not isinstance(emotions, list) or len(emotions) != len(messages):
+                raise ValueError(f"返回的情绪数量与消息数量不一致: {emotions}")
+            
+            return [emotion if emotion in _EMOTION_SET else "平静" for emotion in emotions]
         except Exception as e:
-            logger.error(f"情绪分析出错: {e}")
-            return "平静"
+            logger.error(f"批量情绪分析出错: {e}")
+            return ["平静"] * len(messages)
     
     def get_market_state(self) -> str:
         """
-        获取当前市场状态（简化版，实际应从API获取）
+        获取当前市场状态（简化版，实际应从API获取），MARKET_STATE_TTL秒内所有用户共用同一结果
         
         Returns:
             市场状态
         """
+        timestamp, market_state = self._market_state_cache
+        if market_state is not None and time.monotonic() - timestamp < MARKET_STATE_TTL:
+            return market_state
+        
         # 这里是简化实现，实际应用中应该从市场数据API获取真实的市场状态
         # 这里随机返回一种市场状态
-        import random
-        return random.choice(list(MARKET_STATES.values()))
+        market_state = random.choice(_MARKET_STATE_LIST)
+        self._market_state_cache = (time.monotonic(), market_state)
+        return market_state
     
-    def generate_motivational_response(self, user_id: str, emotion: str, market_state: str) -> str:
+    async def generate_motivational_response(self, user_id: str, message: str, market_state: str) -> str:
         """
-        生成激励性回应
+        生成激励性回应，同一次API调用中完成情绪分析
         
         Args:
             user_id: 用户ID
-            emotion: 用户情绪
+            message: 用户消息
             market_state: 市场状态
         
         Returns:
@@ -195,64 +627,54 @@ class HODLBoxAgent:
                 return "您好！欢迎使用韭菜罐子心理按摩助手。请问您想了解什么？"
             
             user_profile = self.user_profiles[user_id]
-            name = user_profile["name"]
-            risk_profile = user_profile["risk_profile"]
-            investment_goal = user_profile["investment_goal"]
-            investment_plan = user_profile["investment_plan"]
             
             # 使用OpenAI API生成个性化回应
-            system_prompt = f"""
-你是韭菜罐子(HODL Box)的心理按摩助手，专门帮助加密货币投资者坚持他们的投资计划，尤其是在市场波动期间。
-
-用户信息：
-- 姓名：{name}
-- 风险偏好：{risk_profile}
-- 投资目标：{investment_goal}
-- 当前情绪：{emotion}
-- 当前市场状态：{market_state}
-
-投资计划：{json.dumps(investment_plan, ensure_ascii=False) if investment_plan else "未设置"}
-
-请根据用户的情况，生成一个富有同理心、鼓励性且专业的回应。
-回应应该：
-1. 先共情用户当前的情绪
-2. 提供符合用户风险偏好的专业建议
-3. 强调长期投资和定投策略的好处
-4. 用简单易懂的语言解释市场波动的必然性
-5. 鼓励用户坚持他们的投资计划
-6. 回应要温暖、专业且简短，不超过150字
-"""
+            system_prompt = _MOTIVATION_SYSTEM_TEMPLATE.format(
+                name=user_profile["name"],
+                risk_profile=user_profile["risk_profile"],
+                investment_goal=user_profile["investment_goal"],
+                market_state=market_state,
+                investment_plan=self._get_plan_json(user_id) or "未设置"
+            )
             
-            response = openai_client.chat.completions.create(
+            response = await get_openai_client().chat.completions.create(
                 model="gpt-3.5-turbo",
                 messages=[
                     {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": "请给我一些心理按摩，我需要坚持我的投资计划。"}
+                    {"role": "user", "content": message}
                 ],
-                max_tokens=200,
-                temperature=0.7
+                temperature=0.7,
+                response_format={"type": "json_object"}
             )
             
-            # 记录激励次数
-            user_profile["motivational_boosts"] += 1
-            user_profile["last_interaction"] = datetime.datetime.now().isoformat()
-            user_profile["mood_history"].append({
-                "timestamp": datetime.datetime.now().isoformat(),
-                "emotion": emotion,
-                "market_state": market_state
-            })
+            result = orjson.loads(response.choices[0].message.content)
+            # 没有回复内容时使用兜底回应，也不记录本次激励
+            reply = result["reply"].strip()
+            emotion = result.get("emotion")
+            if emotion not in _EMOTION_SET:
+                emotion = "平静"
             
-            self.save_user_profiles()
+            # 记录激励次数和情绪
+            entry = {
+                "op": "mood_append",
+                "uid": user_id,
+                "entry": {
+                    "timestamp": datetime.datetime.now().isoformat(),
+                    "emotion": emotion,
+                    "market_state": market_state
+                }
+            }
+            self._apply_journal_entry(entry)
+            self._append_journal(entry)
             
-            return response.choices[0].message.content.strip()
+            return reply
         except Exception as e:
             logger.error(f"生成激励回应出错: {e}")
-            import random
             return f"不要担心，{user_profile['name'] if user_id in self.user_profiles and 'name' in self.user_profiles[user_id] else '朋友'}，市场波动是暂时的，坚持你的定投计划！" + random.choice(self.positive_quotes)
     
-    def handle_user_message(self, user_id: str, message: str) -> str:
+    async def handle_user_message(self, user_id: str, message: str) -> str:
         """
-        处理用户消息
+        处理用户消息，同一用户的消息按到达顺序依次处理
         
         Args:
             user_id: 用户ID
@@ -261,16 +683,55 @@ class HODLBoxAgent:
         Returns:
             回复消息
         """
-        # 分析用户情绪
-        emotion = self.analyze_user_emotion(message)
+        lock = self._user_locks.get(user_id)
+        if lock is None:
+            lock = self._user_locks[user_id] = asyncio.Lock()
+        async with lock:
+            # 获取市场状态
+            market_state = self.get_market_state()
+            
+            # 生成回应，情绪分析在同一次调用中完成
+            return await self.generate_motivational_response(user_id, message, market_state)
+    
+    async def handle_telegram_message(self, update: "Update", context: "ContextTypes.DEFAULT_TYPE"):
+        """
+        Telegram消息回调，每条消息在独立任务中处理，避免阻塞其他聊天
         
-        # 获取市场状态
-        market_state = self.get_market_state()
+        Args:
+            update: Telegram更新
+            context: 回调上下文
+        """
+        task = asyncio.create_task(self._reply_telegram_message(update))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+    
+    async def shutdown(self, *_):
+        """
+        等待正在处理的消息任务完成，超过TASK_SHUTDOWN_TIMEOUT秒则取消，然后关闭HTTP连接池并合并日志
+        """
+        if self._tasks:
+            _, pending = await asyncio.wait(set(self._tasks), timeout=TASK_SHUTDOWN_TIMEOUT)
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+        await close_http_client()
+        self.close()
+    
+    async def _reply_telegram_message(self, update: "Update"):
+        """
+        处理一条Telegram消息并回复
         
-        # 生成回应
-        return self.generate_motivational_response(user_id, emotion, market_state)
+        Args:
+            update: Telegram更新
+        """
+        try:
+            user_id = str(update.effective_user.id)
+            response = await self.handle_user_message(user_id, update.message.text)
+            await update.message.reply_text(response)
+        except Exception as e:
+            logger.error(f"处理Telegram消息出错: {e}")
     
-    def generate_market_insight(self) -> str:
+    async def generate_market_insight(self) -> str:
         """
         生成市场洞察
         
@@ -278,22 +739,18 @@ class HODLBoxAgent:
             市场洞察
         """
         try:
-            response = openai_client.chat.completions.create(
-                model="gpt-3.5-turbo",
-                messages=[
-                    {"role": "system", "content": "你是一个专业的加密货币市场分析师。请提供一段简短、客观的市场洞察，包括当前市场趋势、潜在风险和机遇。内容要简洁明了，不超过100字。"},
-                    {"role": "user", "content": "请给我一个简短的加密货币市场洞察。"}
-                ],
+            return await cached_chat(
+                "你是一个专业的加密货币市场分析师。请提供一段简短、客观的市场洞察，包括当前市场趋势、潜在风险和机遇。内容要简洁明了，不超过100字。",
+                "请给我一个简短的加密货币市场洞察。",
+                cache=_MARKET_INSIGHT_CACHE,
                 max_tokens=150,
                 temperature=0.7
             )
-            
-            return response.choices[0].message.content.strip()
         except Exception as e:
             logger.error(f"生成市场洞察出错: {e}")
             return "市场波动是投资的一部分，坚持你的长期投资策略是明智之选。"
     
-    def create_investment_report(self, user_id: str) -> str:
+    async def create_investment_report(self, user_id: str) -> str:
         """
         创建投资报告
         
@@ -307,29 +764,182 @@ class HODLBoxAgent:
             return "您还没有设置投资计划，请先创建一个投资计划。"
         
         try:
-            user_profile = self.user_profiles[user_id]
-            name = user_profile["name"]
-            investment_plan = user_profile["investment_plan"]
-            
-            # 使用OpenAI API生成投资报告
-            response = openai_client.chat.completions.create(
-                model="gpt-3.5-turbo",
-                messages=[
-                    {"role": "system", "content": "你是一个专业的投资顾问。请根据用户的投资计划，生成一份简短的投资进度报告和建议。报告要包含投资计划分析、潜在改进空间和鼓励性话语。内容要温暖、专业且简短，不超过150字。"},
-                    {"role": "user", "content": f"用户名：{name}\n投资计划：{json.dumps(investment_plan, ensure_ascii=False)}\n请生成一份简短的投资报告。"}
-                ],
-                max_tokens=200,
-                temperature=0.7
-            )
-            
-            return response.choices[0].message.content.strip()
+            # 使用OpenAI API生成投资报告，投资计划未变时复用缓存
+            system, user = self._investment_report_prompt(user_id)
+            return await cached_chat(system, user, temperature=0.7)
         except Exception as e:
             logger.error(f"生成投资报告出错: {e}")
-            return f"{user_profile['name'] if user_id in self.user_profiles and 'name' in self.user_profiles[user_id] else '朋友'}，继续坚持你的投资计划，定投是积累财富的有效方式！"
+            return self._investment_report_fallback(user_id)
+    
+    async def stream_investment_report(self, user_id: str) -> AsyncIterator[str]:
+        """
+        流式创建投资报告，生成的内容可以立即展示
+        
+        Args:
+            user_id: 用户ID
+        
+        Yields:
+            投资报告内容片段
+        """
+        if user_id not in self.user_profiles or not self.user_profiles[user_id]["investment_plan"]:
+            yield "您还没有设置投资计划，请先创建一个投资计划。"
+            return
+        
+        try:
+            system, user = self._investment_report_prompt(user_id)
+            async for part in stream_chat(system, user, temperature=0.7):
+                yield part
+        except Exception as e:
+            logger.error(f"生成投资报告出错: {e}")
+            yield self._investment_report_fallback(user_id)
+    
+    def _investment_report_prompt(self, user_id: str) -> Tuple[str, str]:
+        """
+        构建投资报告的系统提示和用户消息
+        
+        Args:
+            user_id: 用户ID
+        
+        Returns:
+            (系统提示, 用户消息)
+        """
+        return (
+            "你是一个专业的投资顾问。请根据用户的投资计划，生成一份简短的投资进度报告和建议。报告要包含投资计划分析、潜在改进空间和鼓励性话语。内容要温暖、专业且简短，不超过150字。",
+            f"用户名：{self.user_profiles[user_id]['name']}\n投资计划：{self._get_plan_json(user_id)}\n请生成一份简短的投资报告。"
+        )
+    
+    def _investment_report_fallback(self, user_id: str) -> str:
+        """
+        API调用失败时的投资报告
+        
+        Args:
+            user_id: 用户ID
+        
+        Returns:
+            鼓励性话语
+        """
+        return f"{self.user_profiles[user_id]['name'] if user_id in self.user_profiles and 'name' in self.user_profiles[user_id] else '朋友'}，继续坚持你的投资计划，定投是积累财富的有效方式！"
+    
+    async def generate_reports_bulk(self, user_ids: List[str]) -> Dict[str, str]:
+        """
+        并发为多个用户生成投资报告，例如每日推送
+        
+        Args:
+            user_ids: 用户ID列表
+        
+        Returns:
+            用户ID到投资报告的映射
+        """
+        semaphore = asyncio.Semaphore(REPORT_CONCURRENCY)
+        
+        async def create_report(user_id: str) -> str:
+            async with semaphore:
+                return await self.create_investment_report(user_id)
+        
+        reports = await asyncio.gather(*(create_report(user_id) for user_id in user_ids))
+        return dict(zip(user_ids, reports))
+    
+    async def schedule_bulk_reports(self, user_ids: List[str], model: str = "gpt-3.5-turbo") -> Optional[str]:
+        """
+        通过OpenAI Batch API离线生成投资报告，适合每日定时任务：费用更低且不占用同步请求的速率限制
+        
+        Args:
+            user_ids: 用户ID列表，没有投资计划的用户会被跳过
+            model: 模型名称
+        
+        Returns:
+            Batch任务ID，没有需要生成报告的用户时返回None
+        """
+        lines = []
+        for user_id in user_ids:
+            user_profile = self.user_profiles.get(user_id)
+            if not user_profile or not user_profile["investment_plan"]:
+                continue
+            system, user = self._investment_report_prompt(user_id)
+            lines.append(orjson.dumps({
+                "custom_id": user_id,
+                "method": "POST",
+                "url": "/v1/chat/completions",
+                "body": {
+                    "model": model,
+                    "messages": [
+                        {"role": "system", "content": system},
+                        {"role": "user", "content": user}
+                    ],
+                    "temperature": 0.7
+                }
+            }, option=orjson.OPT_APPEND_NEWLINE))
+        if not lines:
+            return None
+        
+        batch_file = await get_openai_client().files.create(file=("reports.jsonl", b"".join(lines)), purpose="batch")
+        batch = await get_openai_client().batches.create(
+            input_file_id=batch_file.id,
+            endpoint="/v1/chat/completions",
+            completion_window="24h"
+        )
+        logger.info(f"已提交{len(lines)}份投资报告的Batch任务: {batch.id}")
+        return batch.id
+    
+    async def collect_bulk_reports(self, batch_id: str, poll_interval: float = BATCH_POLL_INTERVAL) -> Dict[str, str]:
+        """
+        等待Batch任务完成，并把生成的投资报告保存到对应用户的配置中
+        
+        Args:
+            batch_id: schedule_bulk_reports返回的Batch任务ID
+            poll_interval: 查询任务状态的间隔（秒）
+        
+        Returns:
+            用户ID到投资报告的映射，任务失败时为空
+        """
+        batch = await get_openai_client().batches.retrieve(batch_id)
+        while batch.status not in ("completed", "failed", "expired", "cancelled"):
+            await asyncio.sleep(poll_interval)
+            batch = await get_openai_client().batches.retrieve(batch_id)
+        
+        if batch.status != "completed" or not batch.output_file_id:
+            logger.error(f"Batch任务{batch_id}未完成: {batch.status}")
+            return {}
+        
+        output = await get_openai_client().files.content(batch.output_file_id)
+        reports = {}
+        timestamp = datetime.datetime.now().isoformat()
+        for line in output.text.splitlines():
+            if not line:
+                continue
+            result = orjson.loads(line)
+            user_id = result["custom_id"]
+            response = result.get("response")
+            if not response or response["status_code"] != 200:
+                logger.error(f"用户{user_id}的投资报告生成失败: {result.get('error')}")
+                continue
+            reports[user_id] = response["body"]["choices"][0]["message"]["content"].strip()
+            if user_id in self.user_profiles:
+                entry = {"op": "report", "uid": user_id, "content": reports[user_id], "timestamp": timestamp}
+                self._apply_journal_entry(entry)
+                self._append_journal(entry)
+        return reports
+
+
+def run_telegram_bot():
+    """
+    以Telegram机器人方式运行，需要设置TELEGRAM_BOT_TOKEN环境变量
+    """
+    # 只在启动机器人时导入，命令行模式无需加载telegram
+    from telegram.ext import Application, MessageHandler, filters
+    
+    agent = HODLBoxAgent()
+    application = Application.builder().token(os.getenv("TELEGRAM_BOT_TOKEN")).post_shutdown(agent.shutdown).build()
+    application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, agent.handle_telegram_message))
+    application.run_polling()
 
 
 # 简单的命令行界面演示
 def main():
+    asyncio.run(_run_cli())
+
+
+async def _run_cli():
     agent = HODLBoxAgent()
     
     print("欢迎使用韭菜罐子(HODL Box)心理按摩助手！")
@@ -357,19 +967,25 @@ def main():
         }
         agent.update_investment_plan(user_id, plan)
     
-    while True:
-        message = input("\n您：")
-        
-        if message.lower() == "exit":
-            print("谢谢使用韭菜罐子心理按摩助手！再见！")
-            break
-        elif message.lower() == "market":
-            print("\n市场洞察：", agent.generate_market_insight())
-        elif message.lower() == "report":
-            print("\n投资报告：", agent.create_investment_report(user_id))
-        else:
-            response = agent.handle_user_message(user_id, message)
-            print(f"\n助手：{response}")
+    try:
+        while True:
+            message = input("\n您：")
+            
+            if message.lower() == "exit":
+                print("谢谢使用韭菜罐子心理按摩助手！再见！")
+                break
+            elif message.lower() == "market":
+                print("\n市场洞察：", await agent.generate_market_insight())
+            elif message.lower() == "report":
+                print("\n投资报告：", end=" ", flush=True)
+                async for part in agent.stream_investment_report(user_id):
+                    print(part, end="", flush=True)
+                print()
+            else:
+                response = await agent.handle_user_message(user_id, message)
+                print(f"\n助手：{response}")
+    finally:
+        await close_http_client()
 
 
 if __name__ == "__main__":
@@ -8,7 +8,6 @@
 """
 
 import sys
-import os
 
 def print_header(title):
     """打印测试标题。"""
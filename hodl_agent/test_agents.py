@@ -8,23 +8,37 @@ HODL Box Agent 测试文件
 确保Agent能够正确处理用户意图并执行相关操作。
 """
 
+import os
 import unittest
 import json
-from typing import Dict, Any
+import tempfile
+import asyncio
+from unittest.mock import patch
+import httpx
+from types import SimpleNamespace
 
 # 导入Agent和工具类
+from agents.base_agent import HODLBoxAgent, SUMMARY_PREFIX
 from agents.swap_agent import SwapAgent
 from agents.mental_support_agent import MentalSupportAgent
 from agents.tools.swap_tools import SwapIntentTool
+from agents.tools import market_tools
+from agents.tools import contract_tools
 from agents.tools.market_tools import MarketDataTool
 from agents.tools.contract_tools import ContractTool
+from agents.response_cache import ResponseCache
 
 class TestSwapAgent(unittest.TestCase):
     """测试Swap Agent功能。"""
     
+    @classmethod
+    def setUpClass(cls):
+        """初始化类内共用的SwapAgent实例。"""
+        cls.agent = SwapAgent()
+    
     def setUp(self):
-        """测试前初始化SwapAgent实例。"""
-        self.agent = SwapAgent()
+        """每个测试前清空对话历史。"""
+        self.agent.reset_conversation()
     
     def test_process_swap_request(self):
         """测试处理代币交换请求。"""
@@ -68,13 +82,38 @@ class TestSwapAgent(unittest.TestCase):
         
         self.assertTrue(self.agent.validate_swap_intent(valid_intent))
         self.assertFalse(self.agent.validate_swap_intent(invalid_intent))
+    
+    def test_extract_swap_intent_from_message_list(self):
+        """测试从助手返回的消息列表中提取交换意图。"""
+        intent = {'chain': 'Ethereum', 'tkBuy': 'BTC', 'tkSell': 'USDT', 'count': '100'}
+        
+        # 函数调用消息携带参数
+        call_messages = [
+            {'role': 'assistant', 'content': '', 'function_call': {
+                'name': 'parse_swap_intent', 'arguments': json.dumps(intent)}},
+            {'role': 'assistant', 'content': '好的'}
+        ]
+        self.assertEqual(self.agent._extract_swap_intent(call_messages), intent)
+        
+        # 函数结果消息携带解析后的JSON
+        result_messages = [
+            {'role': 'function', 'name': 'parse_swap_intent', 'content': json.dumps(intent)}
+        ]
+        self.assertEqual(self.agent._extract_swap_intent(result_messages), intent)
+        
+        # 没有相关函数调用或参数无法解析时返回None
+        self.assertIsNone(self.agent._extract_swap_intent([{'role': 'assistant', 'content': '你好'}]))
+        self.assertIsNone(self.agent._extract_swap_intent([
+            {'role': 'function', 'name': 'parse_swap_intent', 'content': 'not json'}
+        ]))
 
 class TestSwapIntentTool(unittest.TestCase):
     """测试Swap Intent Tool功能。"""
     
-    def setUp(self):
-        """测试前初始化SwapIntentTool实例。"""
-        self.tool = SwapIntentTool()
+    @classmethod
+    def setUpClass(cls):
+        """初始化类内共用的SwapIntentTool实例。"""
+        cls.tool = SwapIntentTool()
     
     def test_call_with_valid_params(self):
         """测试使用有效参数调用工具。"""
@@ -118,6 +157,8 @@ class TestSwapIntentTool(unittest.TestCase):
             ('eth', 'ETH'),
             ('u', 'USDT'),
             ('usdt', 'USDT'),
+            ('50u', 'USDT'),
+            ('2.5 u', 'USDT'),
             ('custom', 'CUSTOM')
         ]
         
@@ -130,9 +171,14 @@ class TestSwapIntentTool(unittest.TestCase):
 class TestMentalSupportAgent(unittest.TestCase):
     """测试心理支持Agent功能。"""
     
+    @classmethod
+    def setUpClass(cls):
+        """初始化类内共用的MentalSupportAgent实例。"""
+        cls.agent = MentalSupportAgent()
+    
     def setUp(self):
-        """测试前初始化MentalSupportAgent实例。"""
-        self.agent = MentalSupportAgent()
+        """每个测试前清空对话历史。"""
+        self.agent.reset_conversation()
     
     def test_analyze_emotion(self):
         """测试情绪分析功能。"""
@@ -147,6 +193,11 @@ class TestMentalSupportAgent(unittest.TestCase):
             with self.subTest(message=message):
                 emotion = self.agent.analyze_emotion(message)
                 self.assertEqual(emotion, expected_emotion)
+        
+        # 批量分析结果应与逐条分析一致
+        messages = [message for message, _ in test_cases]
+        expected = [emotion for _, emotion in test_cases]
+        self.assertEqual(self.agent.batch_analyze_emotions(messages), expected)
     
     def test_provide_support(self):
         """测试提供心理支持功能。"""
@@ -162,13 +213,217 @@ class TestMentalSupportAgent(unittest.TestCase):
         self.assertIn('response', result)
         self.assertIn('motivational_content', result)
         self.assertEqual(result['status'], "success")
+    
+    def test_provide_support_cache_hit(self):
+        """测试缓存命中时不调用模型、返回独立的副本，并记录本轮对话。"""
+        calls = []
+        
+        def run(messages):
+            calls.append(messages[-1]['content'])
+            yield [{'role': 'assistant', 'content': '别担心'}]
+        
+        self.addCleanup(setattr, self.agent, 'assistant', self.agent.assistant)
+        self.agent.assistant = SimpleNamespace(run=run)
+        self.agent.response_cache.clear()
+        self.addCleanup(self.agent.response_cache.clear)
+        
+        first = self.agent.provide_support("缓存测试消息", "bear_market")
+        first['response'][0]['content'] = '被调用方修改'
+        second = self.agent.provide_support("缓存测试消息", "bear_market")
+        
+        self.assertEqual(calls, ["缓存测试消息"])
+        self.assertEqual(second['response'], [{'role': 'assistant', 'content': '别担心'}])
+        self.assertEqual(
+            [(msg['role'], msg['content']) for msg in self.agent.messages[1:]],
+            [('user', '缓存测试消息'), ('assistant', '别担心')] * 2
+        )
+
+class TestBaseAgent(unittest.TestCase):
+    """测试Agent基类的对话历史管理。"""
+    
+    @classmethod
+    def setUpClass(cls):
+        """初始化类内共用的HODLBoxAgent实例。"""
+        cls.agent = HODLBoxAgent()
+    
+    def setUp(self):
+        """每个测试前清空对话历史，并使用两轮的窗口。"""
+        self.agent.reset_conversation()
+        self.agent.max_turns = 2
+        self.addCleanup(setattr, self.agent, 'max_turns', 20)
+        self.addCleanup(setattr, self.agent, '_summarizer', None)
+    
+    def stub_summarizer(self, content):
+        """用返回固定摘要的桩替换摘要模型，并返回记录请求的列表。"""
+        requests = []
+        
+        def chat(messages, stream):
+            requests.append(messages)
+            return [{'role': 'assistant', 'content': content}]
+        
+        self.agent._summarizer = SimpleNamespace(chat=chat)
+        return requests
+    
+    def add_turns(self, count, start=0):
+        """向对话历史追加count轮用户和助手消息。"""
+        for i in range(start, start + count):
+            self.agent.messages.append({'role': 'user', 'content': f'问题{i}'})
+            self.agent.messages.append({'role': 'assistant', 'content': f'回答{i}'})
+    
+    def test_trim_within_window(self):
+        """测试未超出窗口时不裁剪也不生成摘要。"""
+        requests = self.stub_summarizer('摘要')
+        self.add_turns(2)
+        messages = list(self.agent.messages)
+        
+        self.agent._trim_history()
+        
+        self.assertEqual(self.agent.messages, messages)
+        self.assertEqual(self.agent.summary, '')
+        self.assertEqual(requests, [])
+    
+    def test_trim_inserts_summary(self):
+        """测试超出窗口时最早的轮次被折叠进摘要，系统提示保持在开头。"""
+        requests = self.stub_summarizer('摘要A')
+        self.add_turns(3)
+        
+        self.agent._trim_history()
+        
+        self.assertEqual(self.agent.summary, '摘要A')
+        self.assertEqual(self.agent.messages[0], self.agent._get_system_message())
+        self.assertEqual(self.agent.messages[1], {'role': 'user', 'content': SUMMARY_PREFIX + '摘要A'})
+        self.assertEqual([msg['content'] for msg in self.agent.messages[2:]], ['问题1', '回答1', '问题2', '回答2'])
+        self.assertIn('问题0', requests[0][1]['content'])
+        
+        # 再次裁剪时摘要消息不计入窗口，旧摘要与新移出的轮次一起总结
+        requests = self.stub_summarizer('摘要B')
+        self.add_turns(1, start=3)
+        self.agent._trim_history()
+        
+        self.assertEqual(self.agent.messages[1], {'role': 'user', 'content': SUMMARY_PREFIX + '摘要B'})
+        self.assertEqual([msg['content'] for msg in self.agent.messages[2:]], ['问题2', '回答2', '问题3', '回答3'])
+        self.assertTrue(requests[0][1]['content'].startswith('摘要A\n'))
+        self.assertIn('问题1', requests[0][1]['content'])
+    
+    def test_trim_with_empty_summary(self):
+        """测试摘要模型返回空内容时保留移出轮次的原文，而不是直接丢弃。"""
+        self.stub_summarizer('')
+        self.add_turns(3)
+        
+        self.agent._trim_history()
+        
+        self.assertIn('问题0', self.agent.summary)
+        self.assertIn('回答0', self.agent.summary)
+        self.assertEqual(self.agent.messages[1], {'role': 'user', 'content': SUMMARY_PREFIX + self.agent.summary})
+        self.assertEqual(len(self.agent.messages), 6)
+    
+    def test_stream_keeps_both_roles_through_trim(self):
+        """测试助手返回的消息列表加入对话历史，裁剪后窗口和摘要中同时保留用户和助手消息。"""
+        requests = self.stub_summarizer('摘要')
+        
+        def run(messages):
+            # 与qwen-agent的Assistant一样，逐步产出本轮生成的消息列表
+            question = messages[-1]['content']
+            yield [{'role': 'assistant', 'content': ''}]
+            yield [{'role': 'assistant', 'content': question.replace('问题', '回答')}]
+        
+        self.addCleanup(setattr, self.agent, 'assistant', self.agent.assistant)
+        self.agent.assistant = SimpleNamespace(run=run)
+        
+        for i in range(3):
+            response = self.agent.process_message(f'问题{i}')
+            self.assertEqual(response, [{'role': 'assistant', 'content': f'回答{i}'}])
+        
+        self.assertEqual(
+            [(msg['role'], msg['content']) for msg in self.agent.messages[2:]],
+            [('user', '问题1'), ('assistant', '回答1'), ('user', '问题2'), ('assistant', '回答2')]
+        )
+        self.assertIn('assistant: 回答0', requests[0][1]['content'])
+    
+    def test_save_and_load_round_trip(self):
+        """测试JSON Lines保存后追加、裁剪和重置后重写，并能完整加载。"""
+        tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmpdir.cleanup)
+        path = os.path.join(tmpdir.name, 'conversation.jsonl')
+        
+        def saved_lines():
+            with open(path, encoding='utf-8') as f:
+                return [json.loads(line) for line in f]
+        
+        def reload():
+            messages, summary = list(self.agent.messages), self.agent.summary
+            self.agent.reset_conversation()
+            self.agent.load_conversation(path)
+            self.assertEqual(self.agent.messages, messages)
+            self.assertEqual(self.agent.summary, summary)
+        
+        # 再次保存到同一文件时只追加新消息
+        self.add_turns(1)
+        self.agent.save_conversation(path)
+        self.add_turns(1, start=1)
+        self.agent.save_conversation(path)
+        self.assertEqual(saved_lines(), self.agent.messages)
+        reload()
+        
+        # 裁剪后历史被改写，需要重写整个文件，摘要在加载后恢复
+        self.stub_summarizer('摘要')
+        self.add_turns(1, start=2)
+        self.agent._trim_history()
+        self.agent.save_conversation(path)
+        self.assertEqual(saved_lines(), self.agent.messages)
+        reload()
+        self.assertEqual(self.agent.summary, '摘要')
+        
+        # 加载后继续追加
+        self.add_turns(1, start=3)
+        self.agent.save_conversation(path)
+        self.assertEqual(saved_lines(), self.agent.messages)
+        reload()
+        
+        # 重置后只剩系统提示
+        self.agent.reset_conversation()
+        self.agent.save_conversation(path)
+        self.assertEqual(saved_lines(), [self.agent._get_system_message()])
+        reload()
+
+class TestResponseCache(unittest.TestCase):
+    """测试响应缓存功能。"""
+    
+    def test_normalized_hit_and_namespace(self):
+        """测试规范化命中与命名空间隔离。"""
+        cache = ResponseCache()
+        cache.set("我很担心！", {"content": "别担心"}, namespace="bear_market")
+        
+        self.assertEqual(cache.get("我很担心", namespace="bear_market"), {"content": "别担心"})
+        self.assertIsNone(cache.get("我很担心", namespace="bull_market"))
+    
+    def test_expiry_and_eviction(self):
+        """测试过期和LRU淘汰。"""
+        expired = ResponseCache(ttl=-1)
+        expired.set("hello", "world")
+        self.assertIsNone(expired.get("hello"))
+        
+        cache = ResponseCache(max_size=2)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        cache.get("a")
+        cache.set("c", 3)
+        self.assertEqual(len(cache), 2)
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(cache.get("a"), 1)
 
 class TestMarketDataTool(unittest.TestCase):
     """测试市场数据工具功能。"""
     
+    @classmethod
+    def setUpClass(cls):
+        """初始化类内共用的MarketDataTool实例。"""
+        cls.tool = MarketDataTool()
+        cls.use_mock = cls.tool.use_mock
+    
     def setUp(self):
-        """测试前初始化MarketDataTool实例。"""
-        self.tool = MarketDataTool()
+        """每个测试前恢复被修改的模拟数据开关。"""
+        self.tool.use_mock = self.use_mock
     
     def test_get_market_data(self):
         """测试获取市场数据。"""
@@ -197,12 +452,165 @@ class TestMarketDataTool(unittest.TestCase):
                 self.assertIn('volatility', market_state)
                 self.assertIn('advice', market_state)
 
+    def test_analyze_market_state(self):
+        """测试市场状态分类。"""
+        test_cases = [
+            ((6, 12), ('bull_market', 'high')),
+            ((2, 3), ('uptrend', 'medium')),
+            ((-6, -12), ('bear_market', 'high')),
+            ((-0.5, -1), ('downtrend', 'low')),
+            ((0.5, -1), ('sideways', 'low'))
+        ]
+        
+        for (change_24h, change_7d), (trend, volatility) in test_cases:
+            with self.subTest(change_24h=change_24h, change_7d=change_7d):
+                state = self.tool._analyze_market_state({
+                    'price_change_percentage_24h': change_24h,
+                    'price_change_percentage_7d': change_7d
+                })
+                self.assertEqual(state['trend'], trend)
+                self.assertEqual(state['volatility'], volatility)
+                self.assertTrue(state['advice'])
+        
+        # 批量分类结果应与逐条分类一致
+        states = self.tool.analyze_batch(
+            [change_24h for (change_24h, _), _ in test_cases],
+            [change_7d for (_, change_7d), _ in test_cases]
+        )
+        self.assertEqual(
+            [(state['trend'], state['volatility']) for state in states],
+            [expected for _, expected in test_cases]
+        )
+
+    def test_batch_market_data(self):
+        """测试批量获取市场数据。"""
+        self.tool.use_mock = True
+        results = asyncio.run(self.tool.abatch_call(['BTC', 'eth', 'btc']))
+        
+        # 重复的符号只返回一次，并保持输入顺序
+        self.assertEqual([result['symbol'] for result in results], ['BTC', 'ETH'])
+        for result in results:
+            self.assertEqual(result.get('status'), 'success')
+            self.assertIn('market_state', result)
+        
+        # 未指定计价货币时默认使用usd
+        results = asyncio.run(self.tool.abatch_call(['BTC'], None))
+        self.assertEqual(results[0].get('status'), 'success')
+        self.assertEqual(self.tool._parse_params({'symbol': 'BTC', 'vs_currency': None})[1], 'usd')
+
+    def test_symbol_required(self):
+        """测试缺少币种时call直接返回预先序列化的错误，call_dict返回可修改的副本。"""
+        self.assertIs(self.tool.call({}), market_tools._ERR_SYMBOL_REQUIRED_JSON)
+        self.assertIs(asyncio.run(self.tool.acall({'symbol': ''})), market_tools._ERR_SYMBOL_REQUIRED_JSON)
+        result = self.tool.call_dict({})
+        self.assertEqual(result, market_tools._ERR_SYMBOL_REQUIRED)
+        self.assertIsNot(result, market_tools._ERR_SYMBOL_REQUIRED)
+    
+    def test_build_price_url(self):
+        """测试价格请求URL构建。"""
+        url = self.tool._build_price_url('bitcoin,ethereum', 'usd')
+        self.assertEqual(
+            url,
+            self.tool.api_url
+            + '/simple/price?include_24hr_change=true&include_7d_change=true'
+            + '&ids=bitcoin,ethereum&vs_currencies=usd'
+        )
+    
+    def test_single_flight(self):
+        """测试并发请求同一币种时只发出一次API请求。"""
+        self.tool.use_mock = False
+        market_tools._MARKET_DATA_CACHE.clear()
+        self.addCleanup(market_tools._MARKET_DATA_CACHE.clear)
+        
+        async def fake_get(url):
+            await asyncio.sleep(0.01)
+            return httpx.Response(
+                200,
+                json={'single-flight-test': {'usd': 1.0, 'usd_24h_change': 2.0, 'usd_7d_change': 3.0}},
+                request=httpx.Request('GET', url)
+            )
+        
+        async def fetch_all():
+            client = market_tools._get_async_client()
+            with patch.object(client, 'get', side_effect=fake_get) as mock_get:
+                results = await asyncio.gather(*[
+                    self.tool.acall_dict({'symbol': 'single-flight-test'}) for _ in range(5)
+                ])
+                return results, mock_get.call_count
+        
+        results, call_count = asyncio.run(fetch_all())
+        self.assertEqual(call_count, 1)
+        for result in results:
+            self.assertEqual(result['source'], 'CoinGecko API')
+            self.assertIn('market_state', result)
+    
+    def test_single_flight_leader_cancelled(self):
+        """测试发起请求的协程被取消时，等待同一请求的协程重新获取数据而不是被一起取消。"""
+        self.tool.use_mock = False
+        market_tools._MARKET_DATA_CACHE.clear()
+        self.addCleanup(market_tools._MARKET_DATA_CACHE.clear)
+        
+        async def fake_get(url):
+            await asyncio.sleep(0.01)
+            return httpx.Response(
+                200,
+                json={'leader-cancel-test': {'usd': 1.0, 'usd_24h_change': 2.0, 'usd_7d_change': 3.0}},
+                request=httpx.Request('GET', url)
+            )
+        
+        async def fetch_with_cancelled_leader():
+            client = market_tools._get_async_client()
+            with patch.object(client, 'get', side_effect=fake_get) as mock_get:
+                leader = asyncio.create_task(self.tool.acall_dict({'symbol': 'leader-cancel-test'}))
+                await asyncio.sleep(0)
+                waiter = asyncio.create_task(self.tool.acall_dict({'symbol': 'leader-cancel-test'}))
+                await asyncio.sleep(0)
+                leader.cancel()
+                result = await waiter
+                return leader.cancelled(), result, mock_get.call_count
+        
+        leader_cancelled, result, call_count = asyncio.run(fetch_with_cancelled_leader())
+        self.assertTrue(leader_cancelled)
+        self.assertEqual(result['source'], 'CoinGecko API')
+        self.assertEqual(call_count, 2)
+    
+    def test_async_client_per_event_loop(self):
+        """测试每个事件循环使用各自的异步HTTP客户端，关闭后在同一事件循环中重新创建。"""
+        async def get_clients():
+            client = market_tools._get_async_client()
+            self.assertIs(market_tools._get_async_client(), client)
+            await market_tools.aclose_async_client()
+            self.assertTrue(client.is_closed)
+            reopened = market_tools._get_async_client()
+            await market_tools.aclose_async_client()
+            return client, reopened
+        
+        first, reopened = asyncio.run(get_clients())
+        second, _ = asyncio.run(get_clients())
+        self.assertIsNot(first, reopened)
+        self.assertIsNot(first, second)
+    
+    def test_circuit_breaker(self):
+        """测试API连续失败后熔断，直接返回模拟数据。"""
+        self.tool.use_mock = False
+        market_tools._BREAKER.update(fail_count=0, open_until=0.0)
+        self.addCleanup(market_tools._BREAKER.update, fail_count=0, open_until=0.0)
+        
+        with patch.object(market_tools._get_client(), 'get', side_effect=httpx.ConnectError('down')) as mock_get:
+            for _ in range(market_tools.BREAKER_FAILURE_THRESHOLD + 2):
+                data = self.tool._fetch_market_data('breaker-test', 'usd')
+                self.assertEqual(data['source'], 'Mock Data')
+            
+            # 熔断打开后不再请求API
+            self.assertEqual(mock_get.call_count, market_tools.BREAKER_FAILURE_THRESHOLD)
+
 class TestContractTool(unittest.TestCase):
     """测试智能合约工具功能。"""
     
-    def setUp(self):
-        """测试前初始化ContractTool实例。"""
-        self.tool = ContractTool()
+    @classmethod
+    def setUpClass(cls):
+        """初始化类内共用的ContractTool实例。"""
+        cls.tool = ContractTool()
     
     def test_read_contract_call(self):
         """测试合约读取操作。"""
@@ -238,6 +646,20 @@ class TestContractTool(unittest.TestCase):
         self.assertEqual(result.get('status'), 'success')
         # 在mock模式下，类型应该是'mock_write'
         self.assertTrue(result.get('type') in ['write', 'mock_write'])
+    
+    def test_constant_errors(self):
+        """测试固定的错误响应：call直接返回预先序列化的字符串，call_dict返回可修改的副本。"""
+        cases = [
+            ({'function_name': 'symbol'}, contract_tools._ERR_MISSING_PARAMS, contract_tools._ERR_MISSING_PARAMS_JSON),
+            ({'contract_address': '0xdAC17F958D2ee523a2206206994597C13D831ec7', 'function_name': 'swap'},
+             contract_tools._ERR_ABI_REQUIRED, contract_tools._ERR_ABI_REQUIRED_JSON),
+        ]
+        for params, error, error_json in cases:
+            with self.subTest(params=params):
+                self.assertIs(self.tool.call(params), error_json)
+                result = self.tool.call_dict(params)
+                self.assertEqual(result, error)
+                self.assertIsNot(result, error)
 
 class TestAgentIntegration(unittest.TestCase):
     """测试Agent集成功能。"""
@@ -7,198 +7,213 @@ HODL Box API 测试文件
 本文件包含对API接口的测试用例，确保HTTP端点能够正确响应请求。
 """
 
-import unittest
-from unittest.mock import patch, MagicMock
-import json
-from fastapi.testclient import TestClient
-from api import app  # 导入FastAPI应用
-
-class TestAPIEndpoints(unittest.TestCase):
-    """测试API接口功能。"""
-    
-    def setUp(self):
-        """测试前初始化测试客户端。"""
-        self.client = TestClient(app)
-    
-    def test_health_check(self):
-        """测试健康检查接口。"""
-        response = self.client.get("/health")
-        
-        self.assertEqual(response.status_code, 200)
-        self.assertEqual(response.json(), {"status": "healthy", "service": "HODL Box AI Agent API"})
-    
-    @patch('api.SwapAgent.process_swap_request')
-    def test_swap_endpoint(self, mock_process_swap_request):
-        """测试代币交换处理接口。"""
-        # 配置模拟返回值
-        mock_result = {
-            "status": "success",
-            "original_message": "把100U换成BTC",
-            "response": "已解析交换请求",
-            "swap_intent": {
-                "chain": "Ethereum",
-                "tokenIn": "USDT",
-                "tokenOut": "BTC",
-                "amount": "100"
-            }
-        }
-        mock_process_swap_request.return_value = mock_result
-        
-        # 发送测试请求
-        request_data = {
-            "message": "把100U换成BTC",
-            "user_id": "test_user_123"
-        }
-        response = self.client.post("/api/swap", json=request_data)
-        
-        # 验证响应
-        self.assertEqual(response.status_code, 200)
-        response_data = response.json()
-        self.assertEqual(response_data, mock_result)
-        
-        # 验证函数调用
-        mock_process_swap_request.assert_called_once_with("把100U换成BTC")
-    
-    @patch('api.MentalSupportAgent.provide_support')
-    def test_mental_support_endpoint(self, mock_provide_support):
-        """测试心理支持接口。"""
-        # 配置模拟返回值
-        mock_result = {
-            "status": "success",
-            "original_message": "我很担心市场继续下跌",
-            "response": "别担心，市场波动是正常的...",
-            "detected_emotion": "fearful",
-            "motivational_content": "长期投资通常会获得更好的回报..."
-        }
-        mock_provide_support.return_value = mock_result
-        
-        # 发送测试请求
-        request_data = {
-            "message": "我很担心市场继续下跌",
-            "user_id": "test_user_123",
-            "market_state": "bear_market"
-        }
-        response = self.client.post("/api/mental-support", json=request_data)
-        
-        # 验证响应
-        self.assertEqual(response.status_code, 200)
-        response_data = response.json()
-        self.assertEqual(response_data, mock_result)
-        
-        # 验证函数调用
-        mock_provide_support.assert_called_once_with("我很担心市场继续下跌", "bear_market")
-    
-    @patch('api.MarketDataTool')
-    def test_market_data_endpoint(self, mock_MarketDataTool):
-        """测试市场数据接口。"""
-        # 配置模拟对象
-        mock_tool = MagicMock()
-        mock_MarketDataTool.return_value = mock_tool
-        
-        mock_result_str = json.dumps({
-            "status": "success",
-            "symbol": "BTC",
-            "price": 50000,
-            "price_change_percentage_24h": 2.5,
-            "market_state": {
-                "trend": "upward",
-                "volatility": "medium",
-                "advice": "保持观望"
-            }
-        })
-        mock_tool.call.return_value = mock_result_str
-        
-        # 发送测试请求
-        request_data = {
-            "symbol": "BTC",
-            "vs_currency": "USD"
-        }
-        response = self.client.post("/api/market-data", json=request_data)
-        
-        # 验证响应
-        self.assertEqual(response.status_code, 200)
-        response_data = response.json()
-        self.assertEqual(response_data['status'], 'success')
-        self.assertEqual(response_data['symbol'], 'BTC')
-        
-        # 验证函数调用
-        mock_tool.call.assert_called_once()
-    
-    @patch('api.ContractTool')
-    def test_contract_call_endpoint(self, mock_ContractTool):
-        """测试智能合约调用接口。"""
-        # 配置模拟对象
-        mock_tool = MagicMock()
-        mock_ContractTool.return_value = mock_tool
-        
-        mock_result_str = json.dumps({
-            "status": "success",
-            "type": "read",
-            "result": "USDT"
-        })
-        mock_tool.call.return_value = mock_result_str
-        
-        # 发送测试请求
-        request_data = {
-            "contract_address": "0xdAC17F958D2ee523a2206206994597C13D831ec7",
-            "function_name": "symbol",
-            "function_args": [],
-            "is_write_operation": False
-        }
-        response = self.client.post("/api/contract-call", json=request_data)
-        
-        # 验证响应
-        self.assertEqual(response.status_code, 200)
-        response_data = response.json()
-        self.assertEqual(response_data['status'], 'success')
-        self.assertEqual(response_data['type'], 'read')
-        
-        # 验证函数调用
-        mock_tool.call.assert_called_once_with(request_data)
-    
-    @patch('api.SwapAgent')
-    def test_chat_endpoint(self, mock_SwapAgent):
-        """测试通用聊天路由接口。"""
-        # 配置模拟对象
-        mock_agent = MagicMock()
-        mock_SwapAgent.return_value = mock_agent
-        
-        mock_agent.chat.return_value = "这是一个测试回复"
-        
-        # 发送测试请求
-        request_data = {
-            "message": "我想交换一些代币",
-            "user_id": "test_user_123",
-            "agent_type": "swap"
-        }
-        response = self.client.post("/api/chat", json=request_data)
-        
-        # 验证响应
-        self.assertEqual(response.status_code, 200)
-        self.assertEqual(response.json(), {"response": "这是一个测试回复"})
-        
-        # 验证函数调用
-        mock_agent.chat.assert_called_once_with("我想交换一些代币")
-    
-    def test_invalid_endpoint(self):
-        """测试不存在的接口。"""
-        response = self.client.get("/invalid_endpoint")
-        
-        self.assertEqual(response.status_code, 404)
-        self.assertIn("detail", response.json())
-    
-    def test_invalid_agent_type_in_chat(self):
-        """测试无效的Agent类型。"""
-        request_data = {
-            "message": "测试消息",
-            "user_id": "test_user_123",
-            "agent_type": "invalid_agent_type"
-        }
-        response = self.client.post("/api/chat", json=request_data)
-        
-        self.assertEqual(response.status_code, 400)
-        self.assertIn("detail", response.json())
-        self.assertEqual(response.json()["detail"], "Invalid agent_type. Must be 'swap' or 'mental'.")
-
-if __name__ == "__main__":
-    unittest.main()
+from types import SimpleNamespace
+import asyncio
+import orjson
+import pytest
+
+# api_module、app和client等fixture定义在conftest.py中
+
+# 各测试共用的模拟返回值，只在导入时构建一次
+_SWAP_RESULT = {
+    "status": "success",
+    "original_message": "把100U换成BTC",
+    "response": "已解析交换请求",
+    "swap_intent": {
+        "chain": "Ethereum",
+        "tokenIn": "USDT",
+        "tokenOut": "BTC",
+        "amount": "100"
+    }
+}
+_MENTAL_SUPPORT_RESULT = {
+    "status": "success",
+    "original_message": "我很担心市场继续下跌",
+    "response": "别担心，市场波动是正常的...",
+    "detected_emotion": "fearful",
+    "motivational_content": "长期投资通常会获得更好的回报..."
+}
+_MARKET_DATA_FIXTURE = {
+    "status": "success",
+    "symbol": "BTC",
+    "price": 50000,
+    "price_change_percentage_24h": 2.5,
+    "market_state": {
+        "trend": "upward",
+        "volatility": "medium",
+        "advice": "保持观望"
+    }
+}
+_CONTRACT_REQUEST = {
+    "contract_address": "0xdAC17F958D2ee523a2206206994597C13D831ec7",
+    "function_name": "symbol",
+    "function_args": [],
+    "is_write_operation": False
+}
+_CONTRACT_FIXTURE = {
+    "status": "success",
+    "type": "read",
+    "result": "USDT"
+}
+
+# 预先序列化的请求体，发送时无需每次重新编码
+_JSON_HEADERS = {"content-type": "application/json"}
+_CHAT_BODY = orjson.dumps({
+    "message": "我想交换一些代币",
+    "user_id": "test_user_123",
+    "agent_type": "swap"
+})
+_MISSING_MESSAGE_BODY = orjson.dumps({
+    "user_id": "test_user_123"
+})
+_INVALID_REQUEST_BODIES = [
+    ("/api/market-data", orjson.dumps({})),
+    ("/api/market-data", orjson.dumps({"vs_currency": "USD"})),
+    ("/api/market-data/batch", orjson.dumps({"symbols": "BTC"})),
+    ("/api/market-data/batch", orjson.dumps({"symbols": ["BTC"] * 51})),
+    ("/api/contract-call", orjson.dumps({"function_name": "symbol"})),
+    ("/api/contract-call", orjson.dumps({**_CONTRACT_REQUEST, "function_args": "not-a-list"})),
+    ("/api/swap", orjson.dumps({"chain": "Ethereum"})),
+]
+
+class CallRecorder:
+    """返回固定结果并把调用参数记录到列表中的替身，比MagicMock轻量。"""
+    
+    def __init__(self, return_value=None):
+        self.return_value = return_value
+        self.calls = []
+    
+    def __call__(self, *args, **kwargs):
+        self.calls.append((args, kwargs))
+        return self.return_value
+
+class AsyncCallRecorder(CallRecorder):
+    """CallRecorder的异步版本，用于替换acall_dict等协程方法。"""
+    
+    async def __call__(self, *args, **kwargs):
+        return super().__call__(*args, **kwargs)
+
+def asgi_requests(app, requests):
+    """直接通过ASGI并发发送多个请求，不经过TestClient的线程切换，用于只检查状态码的测试。
+    
+    requests中每一项为(method, url, kwargs)，返回的响应与之一一对应。
+    """
+    import httpx
+    
+    async def send():
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as async_client:
+            return await asyncio.gather(*(
+                async_client.request(method, url, **kwargs) for method, url, kwargs in requests
+            ))
+    return asyncio.run(send())
+
+def json_request(path, body):
+    """构建携带JSON请求体的POST请求，用于直接调用以Request为参数的路由函数。"""
+    from starlette.requests import Request
+    
+    async def receive():
+        return {"type": "http.request", "body": body, "more_body": False}
+    
+    scope = {
+        "type": "http",
+        "method": "POST",
+        "path": path,
+        "headers": [(b"content-type", b"application/json")],
+    }
+    return Request(scope, receive)
+
+def asgi_request(app, method, url, **kwargs):
+    """直接通过ASGI发送单个请求。"""
+    return asgi_requests(app, [(method, url, kwargs)])[0]
+
+def test_health_check(client):
+    """测试健康检查接口。"""
+    response = client.get("/health")
+    
+    assert response.status_code == 200
+    response_data = orjson.loads(response.content)
+    assert response_data == {"status": "healthy", "service": "HODL Box API", "version": "1.0.0"}
+
+@pytest.mark.parametrize("factory,method,ret,handler,request_model,body,call_args", [
+    # 代币交换处理接口
+    ("get_swap_agent", "process_swap_request", _SWAP_RESULT, "process_swap_request", "SwapRequest",
+     {"message": "把100U换成BTC"},
+     ("把100U换成BTC",)),
+    # 心理支持接口
+    ("get_mental_support_agent", "provide_support", _MENTAL_SUPPORT_RESULT, "provide_mental_support", "MentalSupportRequest",
+     {"message": "我很担心市场继续下跌", "market_state": "bear_market"},
+     ("我很担心市场继续下跌", "bear_market")),
+    # 市场数据接口
+    ("get_market_tool", "acall_dict", _MARKET_DATA_FIXTURE, "get_market_data", "MarketDataRequest",
+     {"symbol": "BTC", "vs_currency": "USD"},
+     ({"symbol": "BTC", "vs_currency": "USD", "include_market_state": True},)),
+    # 智能合约调用接口
+    ("get_contract_tool", "call_dict", _CONTRACT_FIXTURE, "execute_contract_call", "ContractCallRequest",
+     _CONTRACT_REQUEST,
+     ({**_CONTRACT_REQUEST, "gas_limit": 300000},)),
+], ids=["swap", "mental-support", "market-data", "contract-call"])
+def test_endpoint(api_factories, monkeypatch, factory, method, ret, handler, request_model, body, call_args):
+    """测试接口调用被替换的Agent或工具，并把其结果包装在ResponseModel中返回。
+    
+    直接调用路由函数，只检查返回值，不经过HTTP层。
+    factory为api中缓存Agent或工具实例的工厂函数，替换后返回桩对象，桩对象的method方法返回ret。
+    """
+    api_module = api_factories
+    # 工具的异步方法以a开头，如acall_dict
+    called = AsyncCallRecorder(ret) if method.startswith("a") else CallRecorder(ret)
+    monkeypatch.setattr(api_module, factory, lambda: SimpleNamespace(**{method: called}))
+    
+    request = getattr(api_module, request_model)(**body)
+    result = asyncio.run(getattr(api_module, handler)(request))
+    
+    # 验证响应
+    assert result.model_dump(mode="json") == {"status": "success", "data": ret, "error": None}
+    
+    # 验证函数调用
+    assert called.calls == [(call_args, {})]
+
+def test_chat_endpoint(client, api_factories, monkeypatch):
+    """测试通用聊天路由接口，经过完整的HTTP请求和响应序列化。"""
+    # 配置模拟对象，消息中包含“换”，应路由到交换Agent
+    mock_agent = SimpleNamespace(process_swap_request=CallRecorder(_SWAP_RESULT))
+    monkeypatch.setattr(api_factories, "get_swap_agent", lambda: mock_agent)
+    
+    # 发送测试请求
+    response = client.post("/api/chat", content=_CHAT_BODY, headers=_JSON_HEADERS)
+    
+    # 验证响应
+    assert response.status_code == 200
+    response_data = orjson.loads(response.content)
+    assert response_data == {"type": "swap", "response": _SWAP_RESULT}
+    
+    # 验证函数调用
+    assert mock_agent.process_swap_request.calls == [(("我想交换一些代币",), {})]
+
+def test_invalid_endpoint(app):
+    """测试不存在的接口。"""
+    response = asgi_request(app, "GET", "/invalid_endpoint")
+    
+    assert response.status_code == 404
+    response_data = orjson.loads(response.content)
+    assert "detail" in response_data
+
+def test_missing_message_in_chat(api_module):
+    """测试缺少消息的聊天请求，直接调用路由函数，不经过路由和中间件。"""
+    from fastapi import HTTPException
+    
+    with pytest.raises(HTTPException) as exc_info:
+        asyncio.run(api_module.chat_endpoint(json_request("/api/chat", _MISSING_MESSAGE_BODY)))
+    
+    assert exc_info.value.status_code == 400
+    assert exc_info.value.detail == "Message is required"
+
+def test_invalid_request_bodies(app):
+    """测试缺少必填字段或字段类型错误的请求被拒绝，所有请求并发发送。"""
+    requests = [
+        ("POST", url, {"content": body, "headers": _JSON_HEADERS}) for url, body in _INVALID_REQUEST_BODIES
+    ]
+    
+    for response in asgi_requests(app, requests):
+        assert response.status_code == 422
+        response_data = orjson.loads(response.content)
+        assert "detail" in response_data
@@ -0,0 +1,363 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+HODL Box 心理按摩助手测试文件
+
+本文件包含对main模块的测试用例，OpenAI接口均使用桩对象，不发送真实请求。
+"""
+
+import os
+import asyncio
+import unittest
+import tempfile
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, patch
+
+import orjson
+
+import main
+from agents.response_cache import ResponseCache
+
+def fake_reply(content):
+    """构建只包含回复内容的对话接口返回值。"""
+    return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))])
+
+def stub_openai(test, *contents):
+    """用依次返回contents的桩替换OpenAI客户端，返回对话接口的AsyncMock。"""
+    create = AsyncMock(side_effect=[fake_reply(content) for content in contents])
+    client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)))
+    patcher = patch.object(main, "get_openai_client", return_value=client)
+    patcher.start()
+    test.addCleanup(patcher.stop)
+    return create
+
+def new_agent(test):
+    """创建在临时目录中保存配置的助手，返回(助手, 快照路径, 日志路径)，测试结束前关闭助手。"""
+    tmpdir = tempfile.TemporaryDirectory()
+    test.addCleanup(tmpdir.cleanup)
+    paths = (os.path.join(tmpdir.name, "user_profiles.json"), os.path.join(tmpdir.name, "user_profiles.jsonl"))
+    for name, path in zip(("USER_PROFILES_PATH", "USER_PROFILES_JOURNAL_PATH"), paths):
+        patcher = patch.object(main, name, path)
+        patcher.start()
+        test.addCleanup(patcher.stop)
+    agent = main.HODLBoxAgent()
+    test.addCleanup(agent.close)
+    return (agent, *paths)
+
+class TestUserProfilePersistence(unittest.TestCase):
+    """测试用户配置快照与修改日志的持久化。"""
+    
+    def setUp(self):
+        """每个测试使用独立的临时目录保存快照和日志。"""
+        self.agent, self.snapshot_path, self.journal_path = new_agent(self)
+    
+    def new_agent(self):
+        """创建从同一临时目录加载配置的助手，测试结束前关闭。"""
+        agent = main.HODLBoxAgent()
+        self.addCleanup(agent.close)
+        return agent
+    
+    def record(self, agent, entry):
+        """像业务方法一样应用一条修改并写入日志。"""
+        agent._apply_journal_entry(entry)
+        agent._append_journal(entry)
+    
+    def populate(self, agent):
+        """依次写入创建配置、更新计划、保存报告和两条情绪记录。"""
+        agent.create_user_profile("u1", "小明", "平衡", "长期持有")
+        agent.update_investment_plan("u1", {"asset": "BTC", "amount_per_period": 100})
+        self.record(agent, {"op": "report", "uid": "u1", "content": "报告", "timestamp": "2024-01-01T00:00:00"})
+        for emotion in ("焦虑", "平静"):
+            self.record(agent, {
+                "op": "mood_append",
+                "uid": "u1",
+                "entry": {"timestamp": "2024-01-02T00:00:00", "emotion": emotion, "market_state": "熊市"}
+            })
+    
+    def assert_populated(self, agent):
+        """验证populate写入的修改全部生效且只生效一次。"""
+        profile = agent.user_profiles["u1"]
+        self.assertEqual(profile["name"], "小明")
+        self.assertEqual(profile["investment_plan"], {"asset": "BTC", "amount_per_period": 100})
+        self.assertEqual(profile["last_report"], {"timestamp": "2024-01-01T00:00:00", "content": "报告"})
+        self.assertEqual(profile["motivational_boosts"], 2)
+        self.assertEqual([entry["emotion"] for entry in profile["mood_history"]], ["焦虑", "平静"])
+        self.assertEqual(agent._get_plan_json("u1"), '{"asset":"BTC","amount_per_period":100}')
+    
+    def test_journal_round_trip(self):
+        """测试只有日志、没有快照时重放所有修改。"""
+        agent = self.agent
+        self.populate(agent)
+        self.assertFalse(os.path.exists(self.snapshot_path))
+        
+        self.assert_populated(self.new_agent())
+    
+    def test_skip_torn_last_line(self):
+        """测试跳过写入中断留下的不完整最后一行。"""
+        self.populate(self.agent)
+        with open(self.journal_path, "ab") as f:
+            f.write(b'{"op": "mood_append", "uid": "u1", "ent')
+        
+        self.assert_populated(self.new_agent())
+    
+    def test_compact_truncates_journal(self):
+        """测试合并后日志被清空，快照包含全部修改，之后的修改继续追加到日志。"""
+        agent = self.agent
+        self.populate(agent)
+        agent.compact()
+        
+        self.assertEqual(os.path.getsize(self.journal_path), 0)
+        with open(self.snapshot_path, "rb") as f:
+            self.assertEqual(orjson.loads(f.read())["seq"], 5)
+        reloaded = self.new_agent()
+        self.assert_populated(reloaded)
+        
+        reloaded.update_investment_plan("u1", {"asset": "ETH"})
+        with open(self.journal_path, "rb") as f:
+            self.assertEqual([orjson.loads(line)["seq"] for line in f], [6])
+        self.assertEqual(self.new_agent().user_profiles["u1"]["investment_plan"], {"asset": "ETH"})
+    
+    def test_crash_between_replace_and_truncate(self):
+        """测试快照已替换但日志未清空时，不会重复应用快照已包含的记录。"""
+        agent = self.agent
+        self.populate(agent)
+        self.assertTrue(agent.save_user_profiles())
+        
+        # 日志保持原样，模拟清空之前进程退出；之后的新记录仍需重放
+        self.record(agent, {
+            "op": "mood_append",
+            "uid": "u1",
+            "entry": {"timestamp": "2024-01-03T00:00:00", "emotion": "兴奋", "market_state": "牛市"}
+        })
+        
+        profile = self.new_agent().user_profiles["u1"]
+        self.assertEqual(profile["motivational_boosts"], 3)
+        self.assertEqual([entry["emotion"] for entry in profile["mood_history"]], ["焦虑", "平静", "兴奋"])
+    
+    def test_failed_snapshot_keeps_journal(self):
+        """测试快照保存失败时保留日志。"""
+        agent = self.agent
+        self.populate(agent)
+        size = os.path.getsize(self.journal_path)
+        
+        with patch.object(main.orjson, "dumps", side_effect=TypeError("boom")):
+            agent.compact()
+        
+        self.assertEqual(os.path.getsize(self.journal_path), size)
+        self.assertFalse(os.path.exists(self.snapshot_path))
+        self.assert_populated(self.new_agent())
+    
+    def test_legacy_snapshot(self):
+        """测试加载没有序号的旧版快照。"""
+        with open(self.snapshot_path, "wb") as f:
+            f.write(orjson.dumps({"u1": {
+                "name": "小明",
+                "investment_plan": None,
+                "mood_history": [],
+                "motivational_boosts": 0,
+                "_plan_json": None
+            }}))
+        
+        agent = self.new_agent()
+        self.assertEqual(self.agent.user_profiles, {})
+        self.assertEqual(agent.user_profiles["u1"]["name"], "小明")
+        self.assertNotIn("_plan_json", agent.user_profiles["u1"])
+
+class TestOpenAIClient(unittest.TestCase):
+    """测试OpenAI客户端在事件循环中创建并随关闭重置。"""
+    
+    def test_client_per_event_loop(self):
+        """测试同一事件循环内共用客户端，关闭后在新的事件循环中重新创建。"""
+        async def use_and_close():
+            client = main.get_openai_client()
+            self.assertIs(main.get_openai_client(), client)
+            await main.close_http_client()
+            self.assertIsNone(main._HTTP_CLIENT)
+            return client
+        
+        with patch.dict(os.environ, {"OPENAI_API_KEY": "sk-test"}):
+            first = asyncio.run(use_and_close())
+            second = asyncio.run(use_and_close())
+        self.assertIsNot(first, second)
+
+class TestEmotionAnalysis(unittest.TestCase):
+    """测试批量情绪分析。"""
+    
+    def setUp(self):
+        """创建在临时目录中保存配置的助手。"""
+        self.agent = new_agent(self)[0]
+    
+    def analyze(self, messages):
+        """批量分析messages的情绪。"""
+        return asyncio.run(self.agent.analyze_user_emotions_batch(messages))
+    
+    def test_well_formed_array(self):
+        """测试API返回正确的JSON数组时按编号对应，命中关键词的消息不发送给API。"""
+        create = stub_openai(self, '["贪婪", "平静"]')
+        
+        emotions = self.analyze(["我好担心", "想全部买入", "今天天气不错"])
+        
+        self.assertEqual(emotions, ["焦虑", "贪婪", "平静"])
+        self.assertEqual(create.await_count, 1)
+        prompt = create.await_args.kwargs["messages"][1]["content"]
+        self.assertEqual(prompt, "1. 想全部买入\n2. 今天天气不错")
+    
+    def test_keywords_only(self):
+        """测试所有消息都命中关键词时不调用API。"""
+        create = stub_openai(self)
+        
+        self.assertEqual(self.analyze(["太兴奋了", "有点后悔"]), ["兴奋", "沮丧"])
+        create.assert_not_awaited()
+    
+    def test_invalid_output_falls_back(self):
+        """测试数组长度不对或不是JSON时，未命中关键词的消息回退为平静，命中的保留关键词结果。"""
+        for output in ('["贪婪"]', '贪婪、平静', '{"emotions": ["贪婪", "平静"]}'):
+            with self.subTest(output=output):
+                stub_openai(self, output)
+                self.assertEqual(self.analyze(["我好担心", "想全部买入", "今天天气不错"]), ["焦虑", "平静", "平静"])
+    
+    def test_unknown_label(self):
+        """测试情绪选项之外的标签替换为平静。"""
+        stub_openai(self, '["愤怒", "兴奋"]')
+        
+        self.assertEqual(self.analyze(["想全部买入", "今天天气不错"]), ["平静", "兴奋"])
+
+class TestMotivationalResponse(unittest.TestCase):
+    """测试同一次调用完成情绪分析和激励回应。"""
+    
+    def setUp(self):
+        """创建在临时目录中保存配置的助手，并添加一个用户。"""
+        self.agent = new_agent(self)[0]
+        self.agent.create_user_profile("u1", "小明", "平衡", "长期持有")
+    
+    def respond(self, output):
+        """让桩客户端返回output，生成对u1的激励回应。"""
+        create = stub_openai(self, output)
+        response = asyncio.run(self.agent.generate_motivational_response("u1", "跌了好多", "熊市"))
+        self.assertEqual(create.await_args.kwargs["response_format"], {"type": "json_object"})
+        return response
+    
+    def moods(self):
+        """返回u1记录的情绪。"""
+        return [entry["emotion"] for entry in self.agent.user_profiles["u1"]["mood_history"]]
+    
+    def test_valid_json(self):
+        """测试返回合法JSON时使用回复内容并记录情绪。"""
+        response = self.respond('{"emotion": "沮丧", "reply": " 坚持住，小明！ "}')
+        
+        self.assertEqual(response, "坚持住，小明！")
+        self.assertEqual(self.moods(), ["沮丧"])
+        self.assertEqual(self.agent.user_profiles["u1"]["motivational_boosts"], 1)
+    
+    def test_missing_or_unknown_emotion(self):
+        """测试缺少情绪或情绪不在选项中时记录为平静。"""
+        self.assertEqual(self.respond('{"reply": "加油"}'), "加油")
+        self.assertEqual(self.respond('{"emotion": "愤怒", "reply": "加油"}'), "加油")
+        self.assertEqual(self.moods(), ["平静", "平静"])
+    
+    def test_missing_reply_or_invalid_json(self):
+        """测试缺少回复或不是JSON时返回兜底回应，且不记录激励。"""
+        for output in ('{"emotion": "焦虑"}', '坚持住', '{"emotion": "焦虑", "reply": null}'):
+            with self.subTest(output=output):
+                response = self.respond(output)
+                self.assertTrue(response.startswith("不要担心，小明"))
+        self.assertEqual(self.moods(), [])
+        self.assertEqual(self.agent.user_profiles["u1"]["motivational_boosts"], 0)
+    
+    def test_unknown_user(self):
+        """测试未创建配置的用户直接返回欢迎语，不调用API。"""
+        create = stub_openai(self)
+        
+        response = asyncio.run(self.agent.generate_motivational_response("u2", "你好", "熊市"))
+        
+        self.assertIn("欢迎使用韭菜罐子", response)
+        create.assert_not_awaited()
+
+class TestMessageHandling(unittest.TestCase):
+    """测试按用户串行处理消息，以及退出时处理未完成的任务。"""
+    
+    def setUp(self):
+        """创建助手，并用按指定时间等待后返回的桩替换回应生成。"""
+        self.agent = new_agent(self)[0]
+        self.order = []
+        
+        async def respond(user_id, message, market_state):
+            self.order.append(("start", message))
+            await asyncio.sleep(float(message))
+            self.order.append(("end", message))
+            return f"回复{message}"
+        
+        self.agent.generate_motivational_response = respond
+    
+    def telegram_update(self, user_id, text):
+        """构建Telegram消息更新的桩。"""
+        message = SimpleNamespace(text=text, reply_text=AsyncMock())
+        return SimpleNamespace(effective_user=SimpleNamespace(id=user_id), message=message)
+    
+    def test_same_user_serialized_and_lock_released(self):
+        """测试同一用户的消息依次处理，处理完成后不再保留该用户的锁。"""
+        async def run():
+            replies = await asyncio.gather(
+                self.agent.handle_user_message("u1", "0.02"),
+                self.agent.handle_user_message("u1", "0"),
+            )
+            return replies, len(self.agent._user_locks)
+        
+        replies, lock_count = asyncio.run(run())
+        
+        self.assertEqual(replies, ["回复0.02", "回复0"])
+        self.assertEqual(self.order, [("start", "0.02"), ("end", "0.02"), ("start", "0"), ("end", "0")])
+        self.assertEqual(lock_count, 0)
+    
+    def test_shutdown_waits_and_cancels_tasks(self):
+        """测试退出时等待未完成的消息任务，超时的任务被取消。"""
+        fast, slow = self.telegram_update(1, "0.01"), self.telegram_update(2, "60")
+        
+        async def run():
+            await self.agent.handle_telegram_message(fast, None)
+            await self.agent.handle_telegram_message(slow, None)
+            with patch.object(main, "TASK_SHUTDOWN_TIMEOUT", 0.1):
+                await self.agent.shutdown()
+            return len(self.agent._tasks)
+        
+        self.assertEqual(asyncio.run(run()), 0)
+        fast.message.reply_text.assert_awaited_once_with("回复0.01")
+        slow.message.reply_text.assert_not_awaited()
+
+class TestCachedChat(unittest.TestCase):
+    """测试对话接口的回复缓存。"""
+    
+    def setUp(self):
+        """每个测试使用独立的缓存。"""
+        self.cache = ResponseCache(max_size=16)
+    
+    def chat(self, system, user, **kwargs):
+        """使用本测试的缓存调用cached_chat。"""
+        return asyncio.run(main.cached_chat(system, user, cache=self.cache, **kwargs))
+    
+    def test_identical_call_hits_cache(self):
+        """测试相同的请求第二次直接返回缓存，不再调用API。"""
+        create = stub_openai(self, " 回复 ")
+        
+        self.assertEqual(self.chat("系统提示", "你好", temperature=0), "回复")
+        self.assertEqual(self.chat("系统提示", "你好", temperature=0), "回复")
+        self.assertEqual(create.await_count, 1)
+    
+    def test_different_request_misses_cache(self):
+        """测试用户消息、系统提示、模型或参数不同时都重新调用API。"""
+        create = stub_openai(self, "A", "B", "C", "D", "E")
+        
+        self.assertEqual(self.chat("系统提示", "你好", temperature=0), "A")
+        self.assertEqual(self.chat("系统提示", "再见", temperature=0), "B")
+        self.assertEqual(self.chat("另一个系统提示", "你好", temperature=0), "C")
+        self.assertEqual(self.chat("系统提示", "你好", model="gpt-4o-mini", temperature=0), "D")
+        self.assertEqual(self.chat("系统提示", "你好", temperature=0.7), "E")
+        self.assertEqual(create.await_count, 5)
+        
+        # 之前的请求仍然命中各自的缓存
+        self.assertEqual(self.chat("系统提示", "再见", temperature=0), "B")
+        self.assertEqual(create.await_count, 5)
+
+if __name__ == '__main__':
+    unittest.main()